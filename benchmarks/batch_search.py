@@ -0,0 +1,76 @@
+"""
+Benchmark of the batch route API against a loop over Astar.search()
+
+With --account-risk, the loop runs Astar with an escape field per worker
+instead, Astar.search() weights the heuristic by risk and finds different
+routes than the escape field of the batch. Both are given the map
+compiled once, so that only the searches are compared
+
+    python benchmarks/batch_search.py --workers 10 100 1000
+"""
+from pathlib import Path
+import argparse
+import contextlib
+import io
+import json
+import sys
+import time
+import numpy as np
+
+PATH = Path(__file__).resolve().parent
+sys.path.insert(0, str(PATH.parents[0] / "navigation"))
+
+from astar import Astar, batch_search  # noqa: E402
+from compiled_map import CompiledMap  # noqa: E402
+from escape_field import EscapeField  # noqa: E402
+
+PATH_MAP = PATH.parents[0] / "maps" / "2-Navigation_map_v1.0.json"
+
+
+def run(n_workers: int, grid: dict, risk: np.ndarray, heuristic: str,
+        account_risk: bool, seed: int = 0):
+    compiled = CompiledMap.from_grid(grid)
+    rng = np.random.default_rng(seed)
+    starts = rng.choice(np.flatnonzero(compiled.traversable), n_workers)
+
+    # Silence the path found messages
+    with contextlib.redirect_stdout(io.StringIO()):
+        tic = time.perf_counter()
+        for start in starts:
+            # Same cost model as the batch
+            field = EscapeField(compiled, heuristic, account_risk) \
+                if account_risk else None
+            astar = Astar(int(start), compiled, heuristic, account_risk,
+                          escape_field=field)
+            astar.update_risk(risk)
+            astar.search()
+        loop = time.perf_counter() - tic
+
+        tic = time.perf_counter()
+        batch_search(starts, compiled, risk, heuristic, account_risk)
+        batch = time.perf_counter() - tic
+
+    return {"workers": n_workers, "loop_s": loop, "batch_s": batch,
+            "speedup": loop / batch}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=[1, 10, 100])
+    parser.add_argument("--heuristic", default="euclidean")
+    parser.add_argument("--account-risk", action="store_true")
+    args = parser.parse_args()
+
+    with open(PATH_MAP) as f:
+        grid = json.load(f)
+
+    risk = np.random.default_rng(0).integers(
+        0, 10, grid["rows"] * grid["columns"])
+
+    for n_workers in args.workers:
+        print(run(n_workers, grid, risk, args.heuristic, args.account_risk))
+
+
+if __name__ == "__main__":
+    main()
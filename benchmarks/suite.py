@@ -0,0 +1,367 @@
+"""
+Benchmark suite of the search, spectral and risk pipelines on synthetic
+inputs (see synthetic.py)
+
+    astar   Astar.search, every heuristic, with and without risk, starts
+            at short, medium and long distance from the safe zones
+    hpa     HierarchicalPlanner, build, rebuild after a local risk change
+            and route queries, against a full EscapeField build
+    queue   Astar.search with each priority queue (heap, indexed, bucket),
+            manhattan heuristic, with and without risk
+    sat     get_sat, record lengths and numbers of periods
+    risk    Risk.compute_risks_from_cached_db, inventories up to 10k
+            components, footprint index built (cold) or cached (warm)
+
+Results are saved as JSON with the git commit, to be compared across
+commits
+
+    python benchmarks/suite.py --quick
+    python benchmarks/suite.py --groups risk --compare old.json
+"""
+from pathlib import Path
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import scipy
+
+from synthetic import (make_header, make_inventory, make_map, make_record,
+                       make_sensors)
+
+PATH = Path(__file__).resolve().parent
+PATH_REPO = PATH.parents[0]
+sys.path.insert(0, str(PATH_REPO))
+
+from astar import Astar  # noqa: E402
+from escape_field import EscapeField  # noqa: E402
+from hierarchical import HierarchicalPlanner  # noqa: E402
+from src.get_sat import get_sat  # noqa: E402
+
+HEURISTICS = ("manhattan", "euclidean", "diagonal")
+DISTANCES = {"short": 0.1, "medium": 0.5, "long": 0.9}
+
+SIZES = {
+    "astar": [(100, 100), (300, 300), (1000, 1000)],
+    "hpa": [(300, 300), (1000, 1000)],
+    "queue": [(100, 100), (300, 300), (1000, 1000)],
+    "sat": [(1000, 1), (1000, 100), (6000, 1), (6000, 10), (6000, 100),
+            (30000, 100)],
+    "risk": [(1000, 1), (10000, 1), (10000, 4)],
+}
+QUICK_SIZES = {
+    "astar": [(100, 100), (300, 300)],
+    "hpa": [(300, 300)],
+    "queue": [(100, 100), (300, 300)],
+    "sat": [(1000, 1), (6000, 10)],
+    "risk": [(1000, 1)],
+}
+
+
+def measure(func, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        tic = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - tic)
+
+    return {"min_s": min(timings), "median_s": float(np.median(timings)),
+            "repeat": repeat}
+
+
+def get_starts(grid, heuristic: str) -> dict:
+    # Traversable cells at fractions of the largest distance to a safe zone
+    distance = grid.heuristic_table(heuristic)
+    cells = np.flatnonzero(grid.traversable & np.isfinite(distance)
+                           & ~grid.is_safe)
+    cells = cells[np.argsort(distance[cells], kind="stable")]
+
+    return dict((name, int(cells[int(fraction * (len(cells) - 1))]))
+                for name, fraction in DISTANCES.items())
+
+
+def bench_astar(sizes, repeat: int) -> list:
+    results = []
+
+    for rows, columns in sizes:
+        grid = make_map(rows, columns)
+        risk = np.random.default_rng(0).integers(0, 10, grid.n_cells)
+
+        for heuristic in HEURISTICS:
+            starts = get_starts(grid, heuristic)
+
+            for account_risk in (False, True):
+                for distance, start in starts.items():
+                    # A fresh search each time, a finished one is spent
+                    def search():
+                        astar = Astar(start, grid, heuristic, account_risk)
+                        astar.update_risk(risk)
+                        return astar.search()
+
+                    # Silence the path found messages
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        timing = measure(search, repeat)
+                        route = search()
+
+                    results.append({
+                        "group": "astar",
+                        "name": f"{rows}x{columns}/{heuristic}/"
+                                f"{'risk' if account_risk else 'no-risk'}/"
+                                f"{distance}",
+                        "params": {"rows": rows, "columns": columns,
+                                   "heuristic": heuristic,
+                                   "account_risk": account_risk,
+                                   "start": start,
+                                   "route_length": len(route or [])},
+                        **timing,
+                    })
+
+    return results
+
+
+def bench_hpa(sizes, repeat: int) -> list:
+    results = []
+
+    for rows, columns in sizes:
+        grid = make_map(rows, columns)
+        risk = np.random.default_rng(0).integers(0, 10, grid.n_cells)
+        start = get_starts(grid, "euclidean")["long"]
+
+        # Risk changed along the top rows, e.g. a leak in one building
+        changed = risk.copy()
+        changed[:grid.n_cells // 20] = 9
+        states = [risk, changed]
+
+        def build():
+            planner = HierarchicalPlanner(grid, "euclidean", True)
+            planner.update_risk(risk)
+            planner.build()
+            return planner
+
+        def rebuild():
+            # Alternates between the two risk maps
+            states.reverse()
+            planner.update_risk(states[0])
+            planner.build()
+
+        def escape_field():
+            field = EscapeField(grid, "euclidean", True)
+            field.update_risk(risk)
+            field.build()
+
+        planner = build()
+        params = {"rows": rows, "columns": columns, "start": start,
+                  "clusters": planner.n_clusters,
+                  "nodes": len(planner.nodes)}
+
+        for name, func in (("build", build), ("rebuild", rebuild),
+                           ("route", lambda: planner.route(start)),
+                           ("escape_field", escape_field)):
+            timing = measure(func, repeat)
+            results.append({
+                "group": "hpa",
+                "name": f"{rows}x{columns}/{name}",
+                "params": params,
+                **timing,
+            })
+
+    return results
+
+
+def bench_queue(sizes, repeat: int) -> list:
+    results = []
+
+    for rows, columns in sizes:
+        grid = make_map(rows, columns)
+        risk = np.random.default_rng(0).integers(0, 10, grid.n_cells)
+        start = get_starts(grid, "manhattan")["long"]
+
+        for account_risk in (False, True):
+            for queue in Astar.QUEUES:
+                def search():
+                    astar = Astar(start, grid, "manhattan", account_risk,
+                                  queue=queue)
+                    astar.update_risk(risk)
+                    return astar.search()
+
+                # Silence the path found messages
+                with contextlib.redirect_stdout(io.StringIO()):
+                    timing = measure(search, repeat)
+                    route = search()
+
+                results.append({
+                    "group": "queue",
+                    "name": f"{rows}x{columns}/"
+                            f"{'risk' if account_risk else 'no-risk'}/{queue}",
+                    "params": {"rows": rows, "columns": columns,
+                               "account_risk": account_risk, "queue": queue,
+                               "start": start,
+                               "route_length": len(route or [])},
+                    **timing,
+                })
+
+    return results
+
+
+def bench_sat(sizes, repeat: int) -> list:
+    results = []
+
+    for n_samples, n_periods in sizes:
+        acc, time_ = make_record(n_samples)
+        acc, time_ = acc.tolist(), time_.tolist()
+        periods = np.linspace(0.0, 3.0, n_periods) if n_periods > 1 \
+            else np.array([0.5])
+
+        timing = measure(lambda: get_sat(acc, time_, periods, 0.05), repeat)
+        results.append({
+            "group": "sat",
+            "name": f"{n_samples}/{n_periods}",
+            "params": {"samples": n_samples, "periods": n_periods},
+            **timing,
+        })
+
+    return results
+
+
+def bench_risk(sizes, repeat: int) -> list:
+    # Settings of the API, no connection is made
+    for name in ("MONGO_INITDB_ROOT_USERNAME", "MONGO_INITDB_ROOT_PASSWORD",
+                 "DATABASE_NAME", "NAVIGATION_IP_ADDRESS", "NAVIGATION_PORT"):
+        os.environ.setdefault(name, "benchmark")
+
+    import src.risks
+    from src.codec import encode_inventory
+    from src.map_format import save_map_bundle
+    from src.map_registry import MapRegistry
+
+    rows, columns = 1000, 1000
+    results = []
+
+    with tempfile.TemporaryDirectory() as path:
+        grid = make_map(rows, columns)
+        save_map_bundle(Path(path), "benchmark", make_header(grid),
+                        grid.offsets, grid.neighbors)
+        src.risks.map_registry = MapRegistry(Path(path))
+
+        for n_components, n_sensors in sizes:
+            inventory = encode_inventory(
+                make_inventory(n_components, rows, columns))
+            sensor_input = {
+                "map_name": "benchmark",
+                "sensors": make_sensors(n_sensors, 6000, rows, columns),
+                "ambiental_risk": None,
+            }
+
+            def compute(cold: bool):
+                risk = src.risks.Risk(sensor_input, "benchmark",
+                                      inventory=inventory)
+                if cold:
+                    risk.map_entry.derived.pop("footprints", None)
+                risk.compute_risks_from_cached_db()
+
+            for state in ("cold", "warm"):
+                compute(False)
+                timing = measure(lambda: compute(state == "cold"), repeat)
+                results.append({
+                    "group": "risk",
+                    "name": f"{n_components}/{n_sensors}/{state}",
+                    "params": {"components": n_components,
+                               "sensors": n_sensors, "rows": rows,
+                               "columns": columns},
+                    **timing,
+                })
+
+    return results
+
+
+BENCHMARKS = {"astar": bench_astar, "hpa": bench_hpa, "queue": bench_queue,
+              "sat": bench_sat, "risk": bench_risk}
+
+
+def get_metadata() -> dict:
+    def git(*args):
+        try:
+            return subprocess.run(
+                ["git", *args], cwd=PATH_REPO, capture_output=True,
+                text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results: list, baseline: list, threshold: float) -> None:
+    """Prints the ratio of timings to a baseline, flags regressions"""
+    previous = dict(((result["group"], result["name"]), result["min_s"])
+                    for result in baseline)
+
+    for result in results:
+        key = (result["group"], result["name"])
+        if key not in previous:
+            continue
+
+        ratio = result["min_s"] / previous[key]
+        flag = "  REGRESSION" if ratio > 1 + threshold else ""
+        print(f"{key[0]:6} {key[1]:40} {ratio:6.2f}x{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--groups", nargs="+", choices=list(BENCHMARKS),
+                        default=list(BENCHMARKS))
+    parser.add_argument("--quick", action="store_true",
+                        help="smaller inputs only")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path,
+                        help="by default results/<commit>.json")
+    parser.add_argument("--compare", type=Path,
+                        help="results of a previous run")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="slowdown flagged as regression, by default "
+                             "0.2 (20%%)")
+    args = parser.parse_args()
+
+    sizes = QUICK_SIZES if args.quick else SIZES
+    metadata = get_metadata()
+
+    results = []
+    for group in args.groups:
+        print(f"Running {group}...")
+        results.extend(BENCHMARKS[group](sizes[group], args.repeat))
+
+    output = args.output or PATH / "results" / \
+        f"{(metadata['commit'] or 'unknown')[:12]}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"metadata": {**metadata, "quick": args.quick},
+                   "results": results}, f, indent=2)
+
+    for result in results:
+        print(f"{result['group']:6} {result['name']:40} "
+              f"{result['min_s'] * 1e3:10.2f} ms")
+    print(f"Saved to {output}")
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            compare(results, json.load(f)["results"], args.threshold)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Synthetic inputs for the benchmarks
+
+Grids with random obstacles (up to about 1000 x 1000), component
+inventories in the format of src.inventory (e.g. 10k components), and
+acceleration records of sensors
+"""
+from pathlib import Path
+import sys
+import numpy as np
+from bson import ObjectId
+
+PATH = Path(__file__).resolve().parent
+sys.path.insert(0, str(PATH.parents[0] / "navigation"))
+
+from compiled_map import CompiledMap  # noqa: E402
+
+CELL_SIZE_CM = 100.0
+MILLIMETER_PER_PIXEL = 100 / 3
+IM_NAMES = ("PGA", "SA(0.3s, 5%)", "SA(0.5s, 5%)", "SA(1.0s, 5%)",
+            "SA(2.0s, 2%)")
+
+
+def make_map(rows: int, columns: int, obstacles: float = 0.15,
+             n_safe_zones: int = 4, seed: int = 0) -> CompiledMap:
+    """Grid with 4-connected traversable cells and random obstacles
+
+    Parameters
+    ----------
+    rows, columns : int
+        Size of the grid
+    obstacles : float, optional
+        Fraction of cells that are obstacles, by default 0.15
+    n_safe_zones : int, optional
+        Number of safe zones, traversable cells along the border, by
+        default 4
+    seed : int, optional
+        Random seed, by default 0
+
+    Returns
+    -------
+    CompiledMap
+    """
+    rng = np.random.default_rng(seed)
+    free = rng.random((rows, columns)) >= obstacles
+
+    ids = np.arange(rows * columns).reshape(rows, columns)
+    sources, targets = [], []
+    for dy, dx in ((-1, 0), (0, -1), (0, 1), (1, 0)):
+        y0, y1 = max(-dy, 0), rows - max(dy, 0)
+        x0, x1 = max(-dx, 0), columns - max(dx, 0)
+
+        a = ids[y0:y1, x0:x1]
+        b = ids[y0 + dy:y1 + dy, x0 + dx:x1 + dx]
+        connected = free[y0:y1, x0:x1] & free[y0 + dy:y1 + dy, x0 + dx:x1 + dx]
+
+        sources.append(a[connected])
+        targets.append(b[connected])
+
+    sources = np.concatenate(sources)
+    targets = np.concatenate(targets)
+    order = np.argsort(sources, kind="stable")
+
+    offsets = np.zeros(rows * columns + 1, dtype=CompiledMap.DTYPE)
+    np.cumsum(np.bincount(sources, minlength=rows * columns),
+              out=offsets[1:])
+
+    border = np.concatenate([ids[0], ids[-1], ids[1:-1, 0], ids[1:-1, -1]])
+    degree = np.diff(offsets)
+    border = border[degree[border] > 0]
+    safe_zones = np.sort(rng.choice(border, n_safe_zones, replace=False))
+
+    return CompiledMap(rows, columns, offsets, targets[order], safe_zones)
+
+
+def make_header(grid: CompiledMap, scene_name: str = "RealMap") -> dict:
+    """Fields of a map other than the cells, as in maps/*.json"""
+    return {
+        "scene_name": scene_name,
+        "millimeter_per_pixel": MILLIMETER_PER_PIXEL,
+        "cell_size_cm": CELL_SIZE_CM,
+        "cell_size_pixel": 30,
+        "rows": grid.rows,
+        "columns": grid.columns,
+        "safe_zones": grid.safe_zones.tolist(),
+        # Center of cell 0 at (0, 0)
+        "reference": {"cell_id": 0, "h": 15, "v": 15},
+    }
+
+
+def make_inventory(n_components: int, rows: int, columns: int,
+                   seed: int = 0) -> dict:
+    """Component inventory spread over a grid, 1 to 3 locations per
+    component, as loaded by src.inventory
+
+    Parameters
+    ----------
+    n_components : int
+        Number of components
+    rows, columns : int
+        Size of the grid
+    seed : int, optional
+        Random seed, by default 0
+
+    Returns
+    -------
+    dict
+        Component ID: locations, damages and fragilities
+    """
+    rng = np.random.default_rng(seed)
+    height, width = rows * CELL_SIZE_CM, columns * CELL_SIZE_CM
+
+    inventory = dict()
+    for i in range(n_components):
+        component = str(ObjectId())
+
+        locations = []
+        for _ in range(rng.integers(1, 4)):
+            h, v = rng.uniform(0, width), rng.uniform(0, height)
+            w, d = rng.uniform(50, 800, 2)
+            locations.append({
+                "_id": str(ObjectId()),
+                "component": component,
+                "topLeft": [h, v],
+                "bottomRight": [h + w, v + d],
+                "influenceRadius": float(rng.choice([0, 100, 250, 400])),
+            })
+
+        inventory[component] = {
+            "locations": locations,
+            "damages": [{"_id": str(ObjectId()),
+                         "mean": float(rng.uniform(0.05, 1.5)),
+                         "dispersion": float(rng.uniform(0.2, 0.7))}],
+            "fragilities": {"_id": str(ObjectId()), "component": component,
+                            "imName": IM_NAMES[i % len(IM_NAMES)]},
+        }
+
+    return inventory
+
+
+def make_record(n_samples: int, dt: float = 0.01, seed: int = 0):
+    """Acceleration time history in [g] with an envelope, and its time"""
+    rng = np.random.default_rng(seed)
+    time = np.arange(n_samples) * dt
+    duration = time[-1] if n_samples > 1 else 1.0
+
+    envelope = np.exp(-((time - 0.3 * duration) / (0.2 * duration)) ** 2)
+    acc = 0.3 * rng.standard_normal(n_samples) * envelope
+    return acc, time
+
+
+def make_sensors(n_sensors: int, n_samples: int, rows: int, columns: int,
+                 seed: int = 0) -> list:
+    """Sensors of a request spread over a grid"""
+    rng = np.random.default_rng(seed)
+
+    sensors = []
+    for i in range(n_sensors):
+        acc, time = make_record(n_samples, seed=seed + i)
+        sensors.append({
+            "name": f"sensor-{i}",
+            "data": [acc.tolist(), time.tolist()],
+            "location": (float(rng.uniform(0, columns * CELL_SIZE_CM)),
+                         float(rng.uniform(0, rows * CELL_SIZE_CM))),
+        })
+
+    return sensors
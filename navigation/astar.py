@@ -1,9 +1,11 @@
 from pathlib import Path
 from typing import Union, List
 import numpy as np
-from priorityQueue import PriorityQueue
+from priorityQueue import BucketQueue, IndexedHeap, PriorityQueue
 from mapping import Mapping
-from graph_utils import safe_zone_reached, calculate_heuristic
+from compiled_map import CompiledMap
+from escape_field import EscapeField
+from bottleneck import BottleneckSearch
 from utils import success_msg, error_msg
 
 
@@ -26,8 +28,11 @@ class Astar:
         9: 3,
     }
 
-    def __init__(self, start: int, grid: dict, heuristic: str = "euclidean",
-                 account_risk: bool = False):
+    QUEUES = ("heap", "indexed", "bucket")
+
+    def __init__(self, start: int, grid: Union[dict, CompiledMap],
+                 heuristic: str = "euclidean", account_risk: bool = False,
+                 escape_field: EscapeField = None, queue: str = "heap"):
         """Initialize A* algorithm
 
         The "best route" is selected based on
@@ -46,25 +51,44 @@ class Astar:
         ----------
         start : int
             Starting cell ID, location of a worker in an industrial cell
-        grid : dict
-            Map grid
+        grid : Union[dict, CompiledMap]
+            Map grid, compiled once if provided in json format
         heuristic : str, Optional
             Heuristic type, diagonal, euclidean, or manhattan,
             by default euclidean
         account_risk : bool, Optional
             Perform risk-based search?, by default False
+        escape_field : EscapeField, Optional
+            Field precomputed from all safe zones of the same grid, shared
+            between workers. If provided, the route is looked up from the
+            field (with its heuristic and risk settings) instead of running
+            a new search, by default None
+        queue : str, Optional
+            Priority queue of the Open list, heap (binary heap with
+            duplicate entries), indexed (binary heap with decrease-key), or
+            bucket (bucket queue, integer costs only, i.e. manhattan
+            heuristic and integer risk), by default heap
         """
         self.start = start
-        self.grid = grid
+        self.grid = grid if isinstance(grid, CompiledMap) \
+            else CompiledMap.from_grid(grid)
         self.account_risk = account_risk
         self.heuristic = heuristic.lower()
+        self.escape_field = escape_field
+        self.queue = queue.lower()
 
         self._validate_grid()
         self._initialize_risk()
 
+        # Tables shared by every search on the grid
+        # 'h' costs, distance to the nearest safe zone
+        self.HEURISTIC = self.grid.heuristic_table(self.heuristic)
+        # Cost of movement along each connection
+        self.EDGE_COST = self.grid.edge_costs(self.heuristic)
+
         # Priority queue, Open list
         # Risk - Cell IDs, lower the risk, better
-        self.FRONTIER = PriorityQueue()
+        self.FRONTIER = self._initialize_frontier()
 
         # Add start to the Frontier with 0 risk
         self.FRONTIER.add(self.start)
@@ -79,39 +103,51 @@ class Astar:
         self._initialize_movement_costs()
 
     def _validate_grid(self):
-        n_cells = self.grid['rows'] * self.grid['columns']
-
-        if 'safe_zones' not in self.grid or len(self.grid['safe_zones']) == 0:
+        # Cell and safe zone IDs are validated when compiling the grid
+        if len(self.grid.safe_zones) == 0:
             raise ValueError("Safe zones not provided!")
 
-        for cell in self.grid['safe_zones']:
-            if cell > n_cells:
-                raise ValueError("Safe zone ID not matching any ID of cell in "
-                                 "the provided grid")
-
-        if n_cells != len(self.grid['cells']):
-            raise ValueError(
-                "Provided grid number of cells not matching rows x columns!")
-
-        if len(self.grid['cells'][self.start]['connections']) == 0:
+        if not 0 <= self.start < self.grid.n_cells \
+                or not self.grid.traversable[self.start]:
             raise ValueError(f"Start cell {self.start} is not a valid"
                              " traversable cell")
 
+        if self.escape_field is not None \
+                and self.escape_field.grid.n_cells != self.grid.n_cells:
+            raise ValueError("Escape field not matching the provided grid")
+
+        if self.queue not in self.QUEUES:
+            raise ValueError(f"Queue {self.queue} not available, use one of "
+                             f"{', '.join(self.QUEUES)}")
+
+        # Costs are integer with manhattan steps and distances only
+        if self.queue == "bucket" and self.heuristic != "manhattan":
+            raise ValueError("Bucket queue requires integer costs, i.e. the "
+                             "manhattan heuristic")
+
+    def _initialize_frontier(self):
+        if self.queue == "indexed":
+            return IndexedHeap(self.grid.n_cells)
+        if self.queue == "bucket":
+            return BucketQueue(self.grid.n_cells)
+        return PriorityQueue()
+
     def _initialize_movement_costs(self):
         # typically 'g' costs
         self.cost = {self.start: 0}
-        for cell in self.grid['safe_zones']:
+        for cell in self.grid.safe_zones.tolist():
             self.cost[cell] = float("inf")
 
     def search(self):
-        goal = safe_zone_reached(self.grid['safe_zones'])
+        if self.escape_field is not None:
+            return self._search_escape_field()
 
         while self.FRONTIER:
             # The node with the lowest risk
             node = self.FRONTIER.pop()
 
             # Goal reached?
-            if goal(node):
+            if self.grid.is_safe[node]:
                 success_msg("Path found!")
                 self.safe_cell = node
                 self.best_route = self._extract_best_route()
@@ -126,11 +162,9 @@ class Astar:
             self.VISITED.add(node)
 
             # For each successor node (neighbors)
-            for successor in self._get_successors(node):
-                movement_cost = self.cost[node]
-
-                current_cost = movement_cost \
-                    + self._get_cost_of_movement(node, successor)
+            movement_cost = self.cost[node]
+            for successor, step in self._get_successors_with_cost(node):
+                current_cost = movement_cost + step
 
                 if successor not in self.cost:
                     self.cost[successor] = float("inf")
@@ -152,36 +186,50 @@ class Astar:
         error_msg("No path found!")
         return None
 
-    def _compute_f_value(self, node):
-        if self.account_risk:
-            weight = self.risk[node]
-        else:
-            weight = 1
+    def search_minimax(self):
+        """Search for the route minimising the largest RISK value along the
+        path first, and the distance travelled second (see BottleneckSearch)
 
-        return self.cost[node] + weight \
-            * self._get_cost_of_movement(node, self.grid['safe_zones'])
+        Returns
+        -------
+        Union[List[int], None]
+            List containing IDs of cells on the best route
+        """
+        route = BottleneckSearch(self.grid, self.heuristic).search(
+            self.start, self.risk)
+
+        if route is None:
+            error_msg("No path found!")
+            return None
+
+        success_msg("Path found!")
+        self.safe_cell = route[0]
+        self.best_route = route
 
-    def _get_coordinates_cell(self, node):
-        return np.unravel_index(
-            node, (self.grid['rows'], self.grid['columns']))
+        return self.best_route
 
-    def _get_cost_of_movement(self, current: int, end: Union[List[int], int]):
+    def _search_escape_field(self):
+        # Rebuilt only if the risk has changed since the last lookup
+        self.escape_field.update_risk(self.risk)
 
-        current_coord = self._get_coordinates_cell(current)
+        route = self.escape_field.route(self.start)
+        if route is None:
+            error_msg("No path found!")
+            return None
 
-        if isinstance(end, int):
-            end_coord = self._get_coordinates_cell(end)
-            return calculate_heuristic(self.heuristic, current_coord,
-                                       end_coord)
+        success_msg("Path found!")
+        self.safe_cell = route[0]
+        self.best_route = route
+
+        return self.best_route
+
+    def _compute_f_value(self, node):
+        if self.account_risk:
+            weight = self.risk[node]
+        else:
+            weight = 1
 
-        min_g = float("inf")
-        for zone in end:
-            zone_coord = self._get_coordinates_cell(zone)
-            current_g = calculate_heuristic(self.heuristic, current_coord,
-                                            zone_coord)
-            if current_g < min_g:
-                min_g = current_g
-        return min_g
+        return self.cost[node] + weight * self.HEURISTIC[node]
 
     def _extract_best_route(self) -> List[int]:
         """Extract the best route
@@ -211,17 +259,29 @@ class Astar:
         ----------
         risk : Union[np.ndarray, List[int]]
             New risk array
+
+        Raises
+        ------
+        ValueError
+            Length does not match the grid, or non-integer or negative risk
+            with the bucket queue
         """
         risk = np.asarray(risk)
 
-        if len(risk) != len(self.grid['cells']):
+        if len(risk) != self.grid.n_cells:
             raise ValueError("Length of risk array must match the number of"
                              " cells of the grid map")
 
+        # Risk weights the heuristic, priorities must stay integer
+        if self.queue == "bucket" and self.account_risk \
+                and (np.any(risk < 0) or np.any(risk % 1 != 0)):
+            raise ValueError("Bucket queue requires non-negative integer "
+                             "risk values, use the heap or indexed queue")
+
         self.risk = np.maximum(risk, self.risk)
 
     def _initialize_risk(self):
-        self.risk = np.zeros(self.grid['rows'] * self.grid['columns'])
+        self.risk = np.zeros(self.grid.n_cells)
 
     def _retrieve_risk(self, node: int):
         """Gets risk of cell
@@ -245,26 +305,98 @@ class Astar:
         id : List[int]
             IDs of available successor (connection) nodes
         """
-        return self.grid['cells'][node]['connections']
+        return self.grid.successors(node).tolist()
+
+    def _get_successors_with_cost(self, node: int):
+        """Get successor ids along with the costs of movement to them"""
+        start, end = self.grid.offsets[node], self.grid.offsets[node + 1]
+        return zip(self.grid.neighbors[start:end].tolist(),
+                   self.EDGE_COST[start:end].tolist())
 
     def animate(self, pause: float = 0.01, image: Union[str, Path] = None):
         Mapping(self.start, self.grid, pause, image).animate(
             self.best_route, self.VISITED)
 
 
+def batch_search(starts: Union[np.ndarray, List[int]],
+                 grid: Union[dict, CompiledMap],
+                 risk: Union[np.ndarray, List[int]] = None,
+                 heuristic: str = "euclidean", account_risk: bool = False,
+                 escape_field: EscapeField = None
+                 ) -> List[Union[List[int], None]]:
+    """Best routes of many workers on the same risk map
+
+    Validation, risk setup and the search are shared by all workers: a
+    single escape field is built from all safe zones, and every route is
+    then a lookup along the field (see EscapeField).
+
+    Without risk, routes are the shortest routes, as found by
+    Astar.search (ties may be broken differently). With account_risk,
+    routes follow the cost model of the escape field, each step costs its
+    distance times (1 + RISK) of the entered cell, which differs from
+    Astar.search, where the risk weights the heuristic. They are the
+    routes of Astar(..., escape_field=...), not of Astar.search.
+
+    Parameters
+    ----------
+    starts : Union[np.ndarray, List[int]]
+        Starting cell IDs, locations of the workers
+    grid : Union[dict, CompiledMap]
+        Map grid
+    risk : Union[np.ndarray, List[int]], Optional
+        Risk array, by default None (zero risk)
+    heuristic : str, Optional
+        Heuristic type, diagonal, euclidean, or manhattan,
+        by default euclidean
+    account_risk : bool, Optional
+        Perform risk-based search?, by default False
+    escape_field : EscapeField, Optional
+        Field to reuse between calls, heuristic and account_risk are then
+        taken from the field, by default None
+
+    Returns
+    -------
+    List[Union[List[int], None]]
+        Best route of each worker, None where no path is found
+    """
+    if escape_field is None:
+        escape_field = EscapeField(grid, heuristic, account_risk)
+    grid = escape_field.grid
+
+    starts = np.asarray(starts, dtype=int)
+    invalid = (starts < 0) | (starts >= grid.n_cells)
+    invalid[~invalid] = ~grid.traversable[starts[~invalid]]
+    if invalid.any():
+        raise ValueError(f"Start cells {starts[invalid].tolist()} are not "
+                         "valid traversable cells")
+
+    if risk is not None:
+        escape_field.update_risk(risk)
+
+    routes = [escape_field.route(start) for start in starts]
+
+    success_msg(f"Paths found for {sum(r is not None for r in routes)} of "
+                f"{len(routes)} workers")
+
+    return routes
+
+
 if __name__ == '__main__':
 
     import json
 
-    start = 39612
+    start = 1141
 
     # map_image = "../maps/other-maps/fictitious_map_2000cm_tested.png"
 
-    grid = json.load(open("../maps/2-NavigationFile.json"))
+    path_map = Path(__file__).resolve().parents[1] / "maps" / \
+        "2-Navigation_map_v1.0.json"
+    with open(path_map) as f:
+        grid = CompiledMap.from_grid(json.load(f))
     astar = Astar(start, grid, "euclidean", account_risk=True)
 
     # np.random.seed(20)
-    risk = np.random.randint(0, 10, size=len(grid['cells']))
+    risk = np.random.randint(0, 10, size=grid.n_cells)
 
     astar.update_risk(risk)
 
@@ -0,0 +1,122 @@
+from typing import Union, List
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import breadth_first_order, dijkstra
+from compiled_map import CompiledMap
+
+
+class BottleneckSearch:
+    max_risk: float = None
+    distance: float = None
+    safe_cell: int = None
+    best_route: List[int] = None
+
+    def __init__(self, grid: Union[dict, CompiledMap],
+                 heuristic: str = "euclidean"):
+        """Minimax (bottleneck) path search
+
+        The "best route" minimises the largest RISK value encountered on
+        the path first, and the distance travelled second. The risk of the
+        start cell is ignored, as the worker is already there.
+
+        Risk takes only a few discrete levels, so the search is a sweep
+        over the levels: the lowest level at which a safe zone is reachable
+        through cells of lower or equal risk is found by binary search with
+        breadth-first reachability, then a single shortest path search is
+        run through the cells below that level.
+
+        Parameters
+        ----------
+        grid : Union[dict, CompiledMap]
+            Map grid
+        heuristic : str, Optional
+            Heuristic type used as the distance of a step, diagonal,
+            euclidean, or manhattan, by default euclidean
+        """
+        self.grid = grid if isinstance(grid, CompiledMap) \
+            else CompiledMap.from_grid(grid)
+        self.heuristic = heuristic.lower()
+
+        self._sources = self.grid.sources()
+        self._step = self.grid.edge_costs(self.heuristic)
+
+    def _subgraph(self, allowed: np.ndarray, weights: np.ndarray = None):
+        # Keep only the connections entering allowed cells
+        keep = allowed[self.grid.neighbors]
+
+        offsets = np.zeros_like(self.grid.offsets)
+        np.cumsum(np.bincount(self._sources[keep],
+                              minlength=self.grid.n_cells), out=offsets[1:])
+
+        if weights is None:
+            weights = np.ones(len(keep))
+
+        return csr_matrix(
+            (weights[keep], self.grid.neighbors[keep], offsets),
+            shape=(self.grid.n_cells, self.grid.n_cells))
+
+    def _reaches_safe_zone(self, start: int, risk: np.ndarray,
+                           level: float) -> bool:
+        reached = breadth_first_order(
+            self._subgraph(risk <= level), start, directed=True,
+            return_predecessors=False)
+
+        return bool(self.grid.is_safe[reached].any())
+
+    def search(self, start: int, risk: Union[np.ndarray, List[int]]):
+        """Search for the best route
+
+        Parameters
+        ----------
+        start : int
+            Starting cell ID, location of a worker in an industrial cell
+        risk : Union[np.ndarray, List[int]]
+            Risk array
+
+        Returns
+        -------
+        Union[List[int], None]
+            List containing IDs of cells on the best route, from the safe
+            zone to the start, None if no safe zone is reachable
+        """
+        risk = np.asarray(risk)
+
+        if len(risk) != self.grid.n_cells:
+            raise ValueError("Length of risk array must match the number of"
+                             " cells of the grid map")
+
+        self.max_risk = self.distance = None
+        self.safe_cell = self.best_route = None
+
+        levels = np.unique(risk[self.grid.neighbors])
+        if len(levels) == 0 \
+                or not self._reaches_safe_zone(start, risk, levels[-1]):
+            return None
+
+        # Lowest level at which a safe zone is reachable
+        low, high = 0, len(levels) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self._reaches_safe_zone(start, risk, levels[middle]):
+                high = middle
+            else:
+                low = middle + 1
+
+        level = levels[low]
+        distance, parent = dijkstra(
+            self._subgraph(risk <= level, self._step), directed=True,
+            indices=start, return_predecessors=True)
+
+        # Closest safe zone
+        zones = self.grid.safe_zones
+        self.safe_cell = int(zones[np.argmin(distance[zones])])
+        self.distance = float(distance[self.safe_cell])
+
+        path = [self.safe_cell]
+        while path[-1] != start:
+            path.append(int(parent[path[-1]]))
+
+        self.best_route = path
+        self.max_risk = risk[path[:-1]].max() if len(path) > 1 else 0
+
+        return self.best_route
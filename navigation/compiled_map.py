@@ -0,0 +1,207 @@
+from typing import List
+import numpy as np
+from graph_utils import calculate_heuristic_array
+
+
+class CompiledMap:
+    """Map grid compiled into flat NumPy arrays
+
+    Connections of every cell are stored in compressed sparse row (CSR)
+    format: successors of cell 'i' are
+    neighbors[offsets[i]:offsets[i + 1]]
+
+    Attributes
+    ----------
+    rows : int
+        Number of rows in the grid
+    columns : int
+        Number of columns in the grid
+    offsets : np.ndarray
+        CSR offsets of size n_cells + 1
+    neighbors : np.ndarray
+        Successor cell IDs of all cells, concatenated
+    traversable : np.ndarray
+        Boolean mask of cells with at least one outgoing connection
+    row, col : np.ndarray
+        Row and column index of each cell
+    safe_zones : np.ndarray
+        IDs of destination cells
+    is_safe : np.ndarray
+        Boolean mask of safe zone cells
+    """
+    DTYPE = np.int32
+
+    def __init__(self, rows: int, columns: int, offsets: np.ndarray,
+                 neighbors: np.ndarray, safe_zones: np.ndarray):
+        self.rows = int(rows)
+        self.columns = int(columns)
+        self.n_cells = self.rows * self.columns
+
+        self.offsets = np.ascontiguousarray(offsets, dtype=self.DTYPE)
+        self.neighbors = np.ascontiguousarray(neighbors, dtype=self.DTYPE)
+        self.safe_zones = np.asarray(safe_zones, dtype=self.DTYPE)
+
+        self._validate()
+
+        self.degree = np.diff(self.offsets)
+        self.traversable = self.degree > 0
+
+        ids = np.arange(self.n_cells, dtype=self.DTYPE)
+        self.row, self.col = np.divmod(ids, self.DTYPE(self.columns))
+
+        self.is_safe = np.zeros(self.n_cells, dtype=bool)
+        self.is_safe[self.safe_zones] = True
+
+        # Heuristic and edge cost tables, built on first use
+        self._heuristic_tables = {}
+        self._edge_cost_tables = {}
+
+    @classmethod
+    def from_grid(cls, grid: dict) -> "CompiledMap":
+        """Compile a map grid in json format, or loaded from a binary bundle
+
+        Parameters
+        ----------
+        grid : dict
+            Map grid, see ReadMe.md for the structure
+
+        Returns
+        -------
+        CompiledMap
+        """
+        rows, columns = grid['rows'], grid['columns']
+
+        if 'offsets' in grid:
+            # Binary map bundle, already in compressed sparse row format
+            return cls(rows, columns, grid['offsets'], grid['neighbors'],
+                       grid.get('safe_zones', []))
+
+        cells = grid['cells']
+
+        if rows * columns != len(cells):
+            raise ValueError(
+                "Provided grid number of cells not matching rows x columns!")
+
+        # Cells are sorted by ID, left to right, top to bottom
+        degree = np.fromiter((len(cell['connections']) for cell in cells),
+                             dtype=cls.DTYPE, count=len(cells))
+        offsets = np.zeros(len(cells) + 1, dtype=cls.DTYPE)
+        np.cumsum(degree, out=offsets[1:])
+
+        neighbors = np.fromiter(
+            (successor for cell in cells for successor in cell['connections']),
+            dtype=cls.DTYPE, count=int(offsets[-1]))
+
+        return cls(rows, columns, offsets, neighbors,
+                   grid.get('safe_zones', []))
+
+    def _validate(self):
+        if len(self.offsets) != self.n_cells + 1:
+            raise ValueError(
+                "Provided grid number of cells not matching rows x columns!")
+
+        if len(self.neighbors) and (self.neighbors.min() < 0
+                                    or self.neighbors.max() >= self.n_cells):
+            raise ValueError("Connection ID not matching any ID of cell in "
+                             "the provided grid")
+
+        if len(self.safe_zones) and (self.safe_zones.min() < 0
+                                     or self.safe_zones.max() >= self.n_cells):
+            raise ValueError("Safe zone ID not matching any ID of cell in "
+                             "the provided grid")
+
+    def __len__(self):
+        return self.n_cells
+
+    @property
+    def shape(self):
+        return self.rows, self.columns
+
+    def successors(self, node: int) -> np.ndarray:
+        """Get successor ids
+
+        Parameters
+        ----------
+        node : int
+            ID of current cell
+
+        Returns
+        ----------
+        np.ndarray
+            IDs of available successor (connection) nodes
+        """
+        return self.neighbors[self.offsets[node]:self.offsets[node + 1]]
+
+    def sources(self) -> np.ndarray:
+        """Source cell ID of every entry of neighbors, i.e. edge list
+        counterpart of the CSR offsets
+        """
+        return np.repeat(np.arange(self.n_cells, dtype=self.DTYPE),
+                         self.degree)
+
+    def heuristic_table(self, heuristic: str = "euclidean") -> np.ndarray:
+        """Heuristic distance from every cell to the nearest safe zone
+
+        Parameters
+        ----------
+        heuristic : str, Optional
+            Heuristic type, diagonal, euclidean, or manhattan,
+            by default euclidean
+
+        Returns
+        -------
+        np.ndarray
+            Minimum of distances to safe zones, of size n_cells
+        """
+        heuristic = heuristic.lower()
+
+        if heuristic not in self._heuristic_tables:
+            table = np.full(self.n_cells, np.inf)
+            for zone in self.safe_zones:
+                np.minimum(table, calculate_heuristic_array(
+                    heuristic, self.row - self.row[zone],
+                    self.col - self.col[zone]), out=table)
+
+            table.flags.writeable = False
+            self._heuristic_tables[heuristic] = table
+
+        return self._heuristic_tables[heuristic]
+
+    def edge_costs(self, heuristic: str = "euclidean") -> np.ndarray:
+        """Cost of movement along every connection, i.e. heuristic
+        distance between the two connected cells, aligned with neighbors
+
+        Parameters
+        ----------
+        heuristic : str, Optional
+            Heuristic type, diagonal, euclidean, or manhattan,
+            by default euclidean
+
+        Returns
+        -------
+        np.ndarray
+            Cost of movement, of size of neighbors
+        """
+        heuristic = heuristic.lower()
+
+        if heuristic not in self._edge_cost_tables:
+            sources = self.sources()
+            table = calculate_heuristic_array(
+                heuristic, self.row[self.neighbors] - self.row[sources],
+                self.col[self.neighbors] - self.col[sources])
+
+            table.flags.writeable = False
+            self._edge_cost_tables[heuristic] = table
+
+        return self._edge_cost_tables[heuristic]
+
+    def to_coordinates(self, nodes: List[int]):
+        """Row and column indices of cells"""
+        nodes = np.asarray(nodes, dtype=np.intp)
+        return self.row[nodes], self.col[nodes]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in (
+            self.offsets, self.neighbors, self.degree, self.traversable,
+            self.row, self.col, self.safe_zones, self.is_safe))
@@ -0,0 +1,126 @@
+from typing import Union, List
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from compiled_map import CompiledMap
+
+
+class EscapeField:
+    distance: np.ndarray = None
+    next_hop: np.ndarray = None
+    safe_cell: np.ndarray = None
+
+    def __init__(self, grid: Union[dict, CompiledMap],
+                 heuristic: str = "euclidean", account_risk: bool = False):
+        """Escape field, cost-to-go from every cell to the closest safe zone
+
+        A single multi-source Dijkstra search is run backwards from all safe
+        zones over the reversed connections. Every worker's route is then
+        a walk along 'next_hop' from its cell, instead of a new search.
+
+        Cost of moving into a cell is the distance between the two cells
+        (based on the heuristic type). For a risk-based field it is scaled
+        by (1 + RISK) of the entered cell.
+
+        The field is built lazily and rebuilt only once the risk changes.
+
+        Parameters
+        ----------
+        grid : Union[dict, CompiledMap]
+            Map grid
+        heuristic : str, Optional
+            Heuristic type, diagonal, euclidean, or manhattan,
+            by default euclidean
+        account_risk : bool, Optional
+            Perform risk-based search?, by default False
+        """
+        self.grid = grid if isinstance(grid, CompiledMap) \
+            else CompiledMap.from_grid(grid)
+        self.heuristic = heuristic.lower()
+        self.account_risk = account_risk
+
+        if len(self.grid.safe_zones) == 0:
+            raise ValueError("Safe zones not provided!")
+
+        # Distance of each step
+        self._step = self.grid.edge_costs(self.heuristic)
+
+        self.risk = np.zeros(self.grid.n_cells)
+        self._stale = True
+
+    def update_risk(self, risk: Union[np.ndarray, List[int]]) -> bool:
+        """Replaces the risk, the field is rebuilt on next use only if the
+        risk has changed
+
+        Parameters
+        ----------
+        risk : Union[np.ndarray, List[int]]
+            New risk array
+
+        Returns
+        -------
+        bool
+            Has the risk changed?
+        """
+        risk = np.asarray(risk)
+
+        if len(risk) != self.grid.n_cells:
+            raise ValueError("Length of risk array must match the number of"
+                             " cells of the grid map")
+
+        if np.array_equal(risk, self.risk):
+            return False
+
+        self.risk = risk.astype(float)
+        self._stale = self._stale or self.account_risk
+        return True
+
+    def edge_costs(self) -> np.ndarray:
+        """Cost of every connection, aligned with the grid neighbors"""
+        if not self.account_risk:
+            return self._step
+
+        return self._step * (1 + self.risk[self.grid.neighbors])
+
+    def build(self) -> None:
+        """Runs the multi-source search from all safe zones"""
+        n_cells = self.grid.n_cells
+
+        forward = csr_matrix(
+            (self.edge_costs(), self.grid.neighbors, self.grid.offsets),
+            shape=(n_cells, n_cells))
+
+        # Predecessors on the reversed graph are next hops on the original
+        self.distance, self.next_hop, self.safe_cell = dijkstra(
+            forward.T.tocsr(), directed=True, indices=self.grid.safe_zones,
+            return_predecessors=True, min_only=True)
+
+        self._stale = False
+
+    def route(self, start: int) -> Union[List[int], None]:
+        """Extract the best route of a worker
+
+        Parameters
+        ----------
+        start : int
+            Starting cell ID, location of a worker in an industrial cell
+
+        Returns
+        -------
+        Union[List[int], None]
+            List containing IDs of cells on the best route, from the safe
+            zone to the start, None if no safe zone is reachable
+        """
+        if self._stale:
+            self.build()
+
+        if not np.isfinite(self.distance[start]):
+            return None
+
+        path = [int(start)]
+        current = start
+        while not self.grid.is_safe[current]:
+            current = self.next_hop[current]
+            path.append(int(current))
+
+        return path[::-1]
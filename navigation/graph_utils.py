@@ -1,4 +1,5 @@
 import math
+import numpy as np
 
 
 def calculate_heuristic(heuristic: str, current, goal) -> float:
@@ -52,6 +53,43 @@ def calculate_heuristic(heuristic: str, current, goal) -> float:
                          "diagonal or euclidean!")
 
 
+def calculate_heuristic_array(heuristic: str, dx: np.ndarray,
+                              dy: np.ndarray) -> np.ndarray:
+    """Vectorized counterpart of calculate_heuristic
+
+    Parameters
+    ----------
+    heuristic : str
+        Heuristic type, diagonal, euclidean, or manhattan
+    dx : np.ndarray
+        Differences between row indices
+    dy : np.ndarray
+        Differences between column indices
+
+    Returns
+    -------
+    np.ndarray
+        Heuristic distances
+
+    Raises
+    ------
+    ValueError
+        Wrong heuristic type is provided
+    """
+    dx = np.abs(dx).astype(float)
+    dy = np.abs(dy).astype(float)
+
+    if heuristic.lower() == "manhattan":
+        return dx + dy
+    elif heuristic.lower() == "euclidean":
+        return np.hypot(dx, dy)
+    elif heuristic.lower() == "diagonal":
+        return np.maximum(dx, dy) + (math.sqrt(2) - 1) * np.minimum(dx, dy)
+    else:
+        raise ValueError("Wrong heuristic type, must be: manhattan, "
+                         "diagonal or euclidean!")
+
+
 def get_goal_function(target):
     """
     Function to check if we have reached the goal cell
@@ -0,0 +1,355 @@
+from typing import Union, List
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from compiled_map import CompiledMap
+
+
+class HierarchicalPlanner:
+    distance: np.ndarray = None
+    next_hop: np.ndarray = None
+    safe_cell: int = None
+
+    # Border cells per entrance, each entrance is crossed at its middle
+    ENTRANCE_WIDTH = 8
+
+    def __init__(self, grid: Union[dict, CompiledMap],
+                 heuristic: str = "euclidean", account_risk: bool = False,
+                 cluster_size: int = 32):
+        """Hierarchical path search (HPA*) for large maps
+
+        The grid is partitioned into square clusters. Connections between
+        two clusters are grouped into entrances, runs of adjacent border
+        cells, and each entrance is crossed at its middle (transition).
+        The abstract graph has the two cells of every transition and the
+        safe zones as nodes, connected by the transitions and by the
+        costs between the nodes of each cluster, searched within the
+        cluster.
+
+        A route is searched on the abstract graph first, from the start to
+        the entrances of its cluster and then to the closest safe zone
+        (through a field of the abstract graph, built backwards from all
+        safe zones), and then refined on the cells of the clusters it goes
+        through (the corridor) only. A route is found whenever one exists,
+        the whole grid is searched if the abstract graph does not connect
+        the start to a safe zone.
+
+        Cost of moving into a cell is the distance between the two cells
+        (based on the heuristic type). For a risk-based search it is
+        scaled by (1 + RISK) of the entered cell, as in EscapeField. Once
+        the risk changes, the costs of the clusters with changed cells are
+        searched again, and only them.
+
+        Parameters
+        ----------
+        grid : Union[dict, CompiledMap]
+            Map grid
+        heuristic : str, Optional
+            Heuristic type, diagonal, euclidean, or manhattan,
+            by default euclidean
+        account_risk : bool, Optional
+            Perform risk-based search?, by default False
+        cluster_size : int, Optional
+            Rows and columns of cells of a cluster, by default 32
+        """
+        self.grid = grid if isinstance(grid, CompiledMap) \
+            else CompiledMap.from_grid(grid)
+        self.heuristic = heuristic.lower()
+        self.account_risk = account_risk
+
+        if len(self.grid.safe_zones) == 0:
+            raise ValueError("Safe zones not provided!")
+
+        if cluster_size < 1:
+            raise ValueError("Cluster size must be positive!")
+        self.cluster_size = int(cluster_size)
+
+        # Distance of each step, and cost with risk
+        self._step = self.grid.edge_costs(self.heuristic)
+        self._costs = self._step
+
+        self.risk = np.zeros(self.grid.n_cells)
+
+        self._build_clusters()
+        self._build_entrances()
+
+        # Local IDs of the cells of a subgraph, -1 elsewhere
+        self._local = np.full(self.grid.n_cells, -1, dtype=CompiledMap.DTYPE)
+
+        # Costs between the nodes of each cluster
+        self._intra = [None] * self.n_clusters
+        self._dirty = np.ones(self.n_clusters, dtype=bool)
+        self._stale = True
+
+    def _build_clusters(self) -> None:
+        size = self.cluster_size
+        self.cluster_rows = -(-self.grid.rows // size)
+        self.cluster_columns = -(-self.grid.columns // size)
+        self.n_clusters = self.cluster_rows * self.cluster_columns
+
+        self.cluster = ((self.grid.row // size) * self.cluster_columns
+                        + self.grid.col // size).astype(CompiledMap.DTYPE)
+
+        # Cells of each cluster in CSR format, sorted by ID
+        self._cluster_cells = np.argsort(
+            self.cluster, kind="stable").astype(CompiledMap.DTYPE)
+        self._cluster_offsets = np.zeros(self.n_clusters + 1,
+                                         dtype=CompiledMap.DTYPE)
+        np.cumsum(np.bincount(self.cluster, minlength=self.n_clusters),
+                  out=self._cluster_offsets[1:])
+
+    def _build_entrances(self) -> None:
+        size = self.cluster_size
+        row, col = self.grid.row, self.grid.col
+        sources, neighbors = self.grid.sources(), self.grid.neighbors
+
+        # Connections between two clusters
+        crossing = np.flatnonzero(self.cluster[sources]
+                                  != self.cluster[neighbors])
+        source, target = sources[crossing], neighbors[crossing]
+
+        # Position along the border, rows for borders between columns
+        vertical = (row[source] // size == row[target] // size)
+        position = np.where(vertical, row[source], col[source])
+
+        keys = (self.cluster[source], self.cluster[target],
+                row[target] - row[source], col[target] - col[source])
+        order = np.lexsort((position, *keys[::-1]))
+        crossing, position = crossing[order], position[order]
+        keys = [key[order] for key in keys]
+
+        # Entrances, runs of adjacent border cells split every
+        # ENTRANCE_WIDTH cells
+        new_run = np.ones(len(crossing), dtype=bool)
+        new_run[1:] = np.diff(position) != 1
+        for key in keys:
+            new_run[1:] |= key[1:] != key[:-1]
+
+        run_start = np.flatnonzero(new_run)
+        rank = np.arange(len(crossing)) - run_start[np.cumsum(new_run) - 1]
+        first = np.flatnonzero(new_run | (rank % self.ENTRANCE_WIDTH == 0))
+        middle = first + np.diff(np.append(first, len(crossing))) // 2
+
+        # Connection index of each transition
+        self._transitions = crossing[middle]
+        source = sources[self._transitions]
+        target = neighbors[self._transitions]
+
+        # Nodes of the abstract graph, sorted by cell ID
+        self.nodes = np.unique(np.concatenate(
+            [source, target, self.grid.safe_zones])).astype(CompiledMap.DTYPE)
+        self._transition_nodes = (np.searchsorted(self.nodes, source),
+                                  np.searchsorted(self.nodes, target))
+        self._safe_nodes = np.searchsorted(self.nodes, self.grid.safe_zones)
+
+        # Nodes of each cluster in CSR format
+        node_cluster = self.cluster[self.nodes]
+        self._cluster_nodes = np.argsort(node_cluster, kind="stable")
+        self._node_offsets = np.zeros(self.n_clusters + 1,
+                                      dtype=CompiledMap.DTYPE)
+        np.cumsum(np.bincount(node_cluster, minlength=self.n_clusters),
+                  out=self._node_offsets[1:])
+
+    def update_risk(self, risk: Union[np.ndarray, List[int]]) -> bool:
+        """Replaces the risk, the costs of the clusters with changed cells
+        are searched again on next use
+
+        Parameters
+        ----------
+        risk : Union[np.ndarray, List[int]]
+            New risk array
+
+        Returns
+        -------
+        bool
+            Has the risk changed?
+        """
+        risk = np.asarray(risk)
+
+        if len(risk) != self.grid.n_cells:
+            raise ValueError("Length of risk array must match the number of"
+                             " cells of the grid map")
+
+        changed = np.flatnonzero(risk != self.risk)
+        if len(changed) == 0:
+            return False
+
+        self.risk = risk.astype(float)
+
+        if self.account_risk:
+            # Moving into a changed cell starts within its cluster, or is
+            # a connection between clusters, which is not precomputed
+            self._costs = self._step * (1 + self.risk[self.grid.neighbors])
+            self._dirty[self.cluster[changed]] = True
+            self._stale = True
+
+        return True
+
+    @property
+    def n_dirty(self) -> int:
+        """Number of clusters to search again"""
+        return int(self._dirty.sum())
+
+    def _cells(self, cluster: int) -> np.ndarray:
+        return self._cluster_cells[self._cluster_offsets[cluster]:
+                                   self._cluster_offsets[cluster + 1]]
+
+    def _nodes(self, cluster: int) -> np.ndarray:
+        return self._cluster_nodes[self._node_offsets[cluster]:
+                                   self._node_offsets[cluster + 1]]
+
+    def _subgraph(self, cells: np.ndarray) -> csr_matrix:
+        """Connections between the cells (sorted IDs), with local IDs"""
+        n_cells = len(cells)
+        self._local[cells] = np.arange(n_cells)
+
+        degree = self.grid.degree[cells]
+        start = np.cumsum(degree) - degree
+        edges = np.arange(degree.sum()) \
+            + np.repeat(self.grid.offsets[cells] - start, degree)
+
+        targets = self._local[self.grid.neighbors[edges]]
+        kept = targets >= 0
+        sources = np.repeat(np.arange(n_cells), degree)
+
+        self._local[cells] = -1
+
+        return csr_matrix(
+            (self._costs[edges[kept]], (sources[kept], targets[kept])),
+            shape=(n_cells, n_cells))
+
+    def _search_cluster(self, cluster: int) -> None:
+        nodes = self._nodes(cluster)
+        if len(nodes) == 0:
+            self._intra[cluster] = np.zeros((0, 0))
+            return
+
+        cells = self._cells(cluster)
+        local = np.searchsorted(cells, self.nodes[nodes])
+        self._intra[cluster] = dijkstra(self._subgraph(cells), directed=True,
+                                        indices=local)[:, local]
+
+    def build(self) -> None:
+        """Searches the changed clusters, and the abstract graph backwards
+        from all safe zones
+        """
+        for cluster in np.flatnonzero(self._dirty).tolist():
+            self._search_cluster(cluster)
+        self._dirty[:] = False
+
+        sources, targets, costs = [], [], []
+        for cluster, intra in enumerate(self._intra):
+            nodes = self._nodes(cluster)
+            kept = np.isfinite(intra)
+            np.fill_diagonal(kept, False)
+
+            pairs = np.nonzero(kept)
+            sources.append(nodes[pairs[0]])
+            targets.append(nodes[pairs[1]])
+            costs.append(intra[kept])
+
+        sources.append(self._transition_nodes[0])
+        targets.append(self._transition_nodes[1])
+        costs.append(self._costs[self._transitions])
+
+        n_nodes = len(self.nodes)
+        forward = csr_matrix(
+            (np.concatenate(costs),
+             (np.concatenate(sources), np.concatenate(targets))),
+            shape=(n_nodes, n_nodes))
+
+        # Predecessors on the reversed graph are next hops on the original
+        self.distance, self.next_hop = dijkstra(
+            forward.T.tocsr(), directed=True, indices=self._safe_nodes,
+            return_predecessors=True, min_only=True)[:2]
+
+        self._stale = False
+
+    def corridor(self, start: int) -> Union[np.ndarray, None]:
+        """Clusters of the route on the abstract graph
+
+        Parameters
+        ----------
+        start : int
+            Starting cell ID
+
+        Returns
+        -------
+        Union[np.ndarray, None]
+            Cluster IDs, None if the abstract graph does not connect the
+            start to a safe zone
+        """
+        if self._stale:
+            self.build()
+
+        cluster = int(self.cluster[start])
+        nodes = self._nodes(cluster)
+        if len(nodes) == 0:
+            return None
+
+        # Start to the nodes of its cluster, then to the closest safe zone
+        cells = self._cells(cluster)
+        distance = dijkstra(self._subgraph(cells), directed=True,
+                            indices=int(np.searchsorted(cells, start)))
+        total = distance[np.searchsorted(cells, self.nodes[nodes])] \
+            + self.distance[nodes]
+
+        node = nodes[np.argmin(total)]
+        if not np.isfinite(total.min()):
+            return None
+
+        clusters = [cluster]
+        while node >= 0:
+            clusters.append(self.cluster[self.nodes[node]])
+            node = self.next_hop[node]
+
+        return np.unique(clusters)
+
+    def route(self, start: int) -> Union[List[int], None]:
+        """Extract the best route of a worker
+
+        Parameters
+        ----------
+        start : int
+            Starting cell ID, location of a worker in an industrial cell
+
+        Returns
+        -------
+        Union[List[int], None]
+            List containing IDs of cells on the best route, from the safe
+            zone to the start, None if no safe zone is reachable
+        """
+        clusters = self.corridor(start)
+
+        if clusters is None:
+            # Not connected on the abstract graph, e.g. the start cluster
+            # is split by walls and entrances are crossed elsewhere
+            cells = np.arange(self.grid.n_cells, dtype=CompiledMap.DTYPE)
+        else:
+            cells = np.sort(np.concatenate(
+                [self._cells(cluster) for cluster in clusters.tolist()]))
+
+        return self._refine(cells, start)
+
+    def _refine(self, cells: np.ndarray,
+                start: int) -> Union[List[int], None]:
+        distance, parent = dijkstra(
+            self._subgraph(cells), directed=True,
+            indices=int(np.searchsorted(cells, start)),
+            return_predecessors=True)
+
+        safe = np.flatnonzero(self.grid.is_safe[cells])
+        if len(safe) == 0:
+            return None
+
+        current = safe[np.argmin(distance[safe])]
+        if not np.isfinite(distance[current]):
+            return None
+
+        path = []
+        while current >= 0:
+            path.append(int(cells[current]))
+            current = parent[current]
+
+        self.safe_cell = path[0]
+        return path
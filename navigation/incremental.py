@@ -0,0 +1,178 @@
+from heapq import heappush, heappop
+from typing import Union, List
+import numpy as np
+from compiled_map import CompiledMap
+from escape_field import EscapeField
+
+
+class IncrementalEscapeField(EscapeField):
+    # Share of changed cells above which the field is rebuilt from scratch
+    REBUILD_FRACTION = 0.001
+    # Share of cells processed by a repair above which it is abandoned and
+    # the field is rebuilt, each is a Python step against a scipy build
+    REPAIR_FRACTION = 0.002
+
+    def __init__(self, grid: Union[dict, CompiledMap],
+                 heuristic: str = "euclidean", account_risk: bool = True):
+        """Escape field repaired incrementally when the risk changes
+
+        Lifelong Planning A* (LPA*, the backward search of D* Lite) over
+        the reversed connections, with all safe zones as goals and no
+        start, so that the whole field is kept consistent for any worker.
+
+        'g' = current cost-to-go estimate of a cell (the field distance)
+        'rhs' = one-step lookahead, min over successors of cost + 'g'
+
+        A cell is consistent when 'g' equals 'rhs'. A risk update changes
+        the cost of moving into the changed cells, which makes only their
+        predecessors inconsistent, and only the part of the field that
+        routes through them is repaired.
+
+        Parameters
+        ----------
+        grid : Union[dict, CompiledMap]
+            Map grid
+        heuristic : str, Optional
+            Heuristic type, diagonal, euclidean, or manhattan,
+            by default euclidean
+        account_risk : bool, Optional
+            Perform risk-based search?, by default True
+        """
+        super().__init__(grid, heuristic, account_risk)
+
+        # Reversed connections (predecessors) in CSR format, along with the
+        # index of the connection in the original neighbors
+        order = np.argsort(self.grid.neighbors, kind="stable")
+        self._in_edges = order.astype(CompiledMap.DTYPE)
+        self._in_sources = self.grid.sources()[order]
+        self._in_offsets = np.zeros_like(self.grid.offsets)
+        np.cumsum(np.bincount(self.grid.neighbors,
+                              minlength=self.grid.n_cells),
+                  out=self._in_offsets[1:])
+
+        self.rhs = None
+        self._costs = None
+        self._open = []
+
+    def build(self) -> None:
+        super().build()
+
+        self.rhs = self.distance.copy()
+        self._costs = np.array(self.edge_costs())
+        self._open = []
+
+    def update_risk(self, risk: Union[np.ndarray, List[int]]) -> bool:
+        """Replaces the risk and repairs the field around the changed cells
+
+        Parameters
+        ----------
+        risk : Union[np.ndarray, List[int]]
+            New risk array
+
+        Returns
+        -------
+        bool
+            Has the risk changed?
+        """
+        risk = np.asarray(risk)
+
+        if len(risk) != self.grid.n_cells:
+            raise ValueError("Length of risk array must match the number of"
+                             " cells of the grid map")
+
+        changed = np.flatnonzero(risk != self.risk)
+        if len(changed) == 0:
+            return False
+
+        self.risk = risk.astype(float)
+
+        if not self.account_risk:
+            return True
+
+        if self._stale or \
+                len(changed) > self.REBUILD_FRACTION * self.grid.n_cells:
+            self._stale = True
+            return True
+
+        self._repair(changed)
+        return True
+
+    def _repair(self, changed: np.ndarray) -> None:
+        # Connections into the changed cells, in the reversed CSR
+        degree = self._in_offsets[changed + 1] - self._in_offsets[changed]
+        start = np.cumsum(degree) - degree
+        positions = np.arange(degree.sum()) \
+            + np.repeat(self._in_offsets[changed] - start, degree)
+
+        # Cost of moving into the changed cells
+        edges = self._in_edges[positions]
+        self._costs[edges] = self._step[edges] \
+            * (1 + self.risk[self.grid.neighbors[edges]])
+
+        for node in np.unique(self._in_sources[positions]).tolist():
+            self._update_vertex(node)
+
+        if not self._compute_shortest_paths(
+                int(self.REPAIR_FRACTION * self.grid.n_cells)):
+            # Too large to repair, rebuilt on next use
+            self._open = []
+            self._stale = True
+
+        # Reached safe zones are not tracked through the repairs
+        self.safe_cell = None
+
+    def _update_vertex(self, node: int) -> None:
+        distance, rhs = self.distance, self.rhs
+
+        if not self.grid.is_safe[node]:
+            offsets, neighbors = self.grid.offsets, self.grid.neighbors
+            start, end = offsets[node], offsets[node + 1]
+
+            if start == end:
+                rhs[node] = np.inf
+            else:
+                costs = self._costs[start:end] \
+                    + distance[neighbors[start:end]]
+                best = costs.argmin()
+                cost = costs[best]
+                rhs[node] = cost
+                # No route to a safe zone
+                self.next_hop[node] = neighbors[start + best] \
+                    if cost < np.inf else -9999
+
+        g, lookahead = distance[node], rhs[node]
+        if g != lookahead:
+            heappush(self._open, (min(g, lookahead), node))
+
+    def _predecessors(self, node: int) -> List[int]:
+        return self._in_sources[
+            self._in_offsets[node]:self._in_offsets[node + 1]].tolist()
+
+    def _compute_shortest_paths(self, limit: int) -> bool:
+        """Processes the inconsistent cells, False if more than limit"""
+        processed = 0
+        while self._open:
+            key, node = heappop(self._open)
+
+            g, rhs = self.distance[node], self.rhs[node]
+
+            # Consistent, or superseded by a newer entry
+            if g == rhs or key != min(g, rhs):
+                continue
+
+            processed += 1
+            if processed > limit:
+                return False
+
+            if g > rhs:
+                # Overconsistent, cost-to-go decreased
+                self.distance[node] = rhs
+            else:
+                # Underconsistent, cost-to-go increased
+                self.distance[node] = np.inf
+                self._update_vertex(node)
+
+            for predecessor in self._predecessors(node):
+                self._update_vertex(predecessor)
+
+        return True
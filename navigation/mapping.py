@@ -1,10 +1,12 @@
+from typing import Union
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.image as mpimg
+from compiled_map import CompiledMap
 
 
 class Mapping:
-    def __init__(self, start: int, grid: dict,
+    def __init__(self, start: int, grid: Union[dict, CompiledMap],
                  pause: float = 0.01, image=None):
         """Initialize mapping
 
@@ -12,14 +14,16 @@ class Mapping:
         ----------
         start : int
             Identifier of start node
-        grid : dict
+        grid : Union[dict, CompiledMap]
             Grid map
         pause : float, Optional
             Pause time for animation, by default 0.01
         image: Union[str, Path], Optional
             Map .png image, by default None
         """
-        self.start, self.grid = start, grid
+        self.start = start
+        self.grid = grid if isinstance(grid, CompiledMap) \
+            else CompiledMap.from_grid(grid)
         self.pause = pause
         self.image = image
 
@@ -35,8 +39,8 @@ class Mapping:
 
     def animate(self, path, visited):
         fig, ax = plt.subplots(figsize=(4, 3), dpi=100)
-        plt.xlim([0, self.grid['columns'] - 1])
-        plt.ylim([0, self.grid['rows'] - 1])
+        plt.xlim([0, self.grid.columns - 1])
+        plt.ylim([0, self.grid.rows - 1])
 
         self._plot_image()
         self.create_map()
@@ -50,8 +54,8 @@ class Mapping:
         if self.image is None:
             return
 
-        xlim = [0, self.grid['columns'] - 1]
-        ylim = [0, self.grid['rows'] - 1]
+        xlim = [0, self.grid.columns - 1]
+        ylim = [0, self.grid.rows - 1]
 
         img = mpimg.imread(self.image)
 
@@ -61,8 +65,7 @@ class Mapping:
                    aspect='auto')
 
     def _to_coordinate(self, node):
-        return np.unravel_index(
-            node, (self.grid['rows'], self.grid['columns']))
+        return self.grid.row[node], self.grid.col[node]
 
     def create_map(self):
 
@@ -70,26 +73,15 @@ class Mapping:
 
         plt.plot(start_coord[1], start_coord[0], "rs")
 
-        for zone in self.grid['safe_zones']:
-            zone_coord = self._to_coordinate(zone)
-            plt.plot(zone_coord[1], zone_coord[0], "gs")
+        zone_coord = self._to_coordinate(self.grid.safe_zones)
+        plt.plot(zone_coord[1], zone_coord[0], "gs")
 
         # Plot the internal non-traversable terrain as black
-        for cell in self.grid['cells']:
-            if len(cell['connections']) != 0:
-                continue
-
-            cell_coord = self._to_coordinate(cell['id'])
-
-            plt.plot(cell_coord[1], cell_coord[0], "sk")
+        obstacles = ~self.grid.traversable
+        plt.plot(self.grid.col[obstacles], self.grid.row[obstacles], "sk")
 
     def _plot_path(self, path, cl='r', flag=False):
-        path_x = []
-        path_y = []
-        for cell in path:
-            x, y = self._to_coordinate(cell)
-            path_x.append(x)
-            path_y.append(y)
+        path_x, path_y = self._to_coordinate(np.asarray(path, dtype=int))
 
         if not flag:
             plt.plot(path_y, path_x, linewidth='3', color='r')
@@ -102,7 +94,7 @@ class Mapping:
         if self.start in visited:
             visited.remove(self.start)
 
-        for zone in self.grid['safe_zones']:
+        for zone in self.grid.safe_zones.tolist():
             if zone in visited:
                 visited.remove(zone)
 
@@ -3,9 +3,8 @@ from heapq import heappush, heappop
 
 class PriorityQueue:
     def __init__(self, iterable=None):
-        if iterable is None:
-            iterable = []
-            self.heap = []
+        self.heap = []
+        if iterable is not None:
             for value in iterable:
                 heappush(self.heap, (0, value))
 
@@ -26,3 +25,218 @@ class PriorityQueue:
 
     def __len__(self):
         return len(self.heap)
+
+
+class IndexedHeap:
+    def __init__(self, size: int, iterable=None):
+        """Binary heap of values 0 to size - 1 (cell IDs) with decrease-key
+
+        Every value is queued at most once: adding a queued value updates
+        its priority in place, instead of pushing a duplicate, so the heap
+        never grows beyond the number of queued values. Positions and
+        priorities are kept in arrays preallocated to size. Ties are
+        popped in order of value, as with PriorityQueue.
+
+        Parameters
+        ----------
+        size : int
+            Number of values, e.g. number of cells of the grid
+        iterable : optional
+            Values queued with priority 0, by default None
+        """
+        self.heap = []
+        # Index of each value in the heap, -1 if not queued
+        self._position = [-1] * size
+        self._priority = [0] * size
+
+        if iterable is not None:
+            for value in iterable:
+                self.add(value)
+
+    def add(self, value: int, priority: float = 0):
+        """Add, or update the priority of a queued value
+
+        Parameters
+        ----------
+        value : int
+        priority : float, optional
+            by default 0
+        """
+        position = self._position[value]
+
+        if position < 0:
+            self._priority[value] = priority
+            self.heap.append(value)
+            self._sift_up(len(self.heap) - 1)
+
+        elif priority < self._priority[value]:
+            self._priority[value] = priority
+            self._sift_up(position)
+
+        elif priority > self._priority[value]:
+            self._priority[value] = priority
+            self._sift_down(position)
+
+    def pop(self) -> int:
+        heap = self.heap
+        value = heap[0]
+        last = heap.pop()
+        self._position[value] = -1
+
+        if heap:
+            heap[0] = last
+            self._sift_down(0)
+
+        return value
+
+    def _sift_up(self, index: int):
+        heap, position, priorities = self.heap, self._position, self._priority
+        value = heap[index]
+        priority = priorities[value]
+
+        while index > 0:
+            parent = (index - 1) >> 1
+            other = heap[parent]
+            other_priority = priorities[other]
+
+            if other_priority < priority or \
+                    (other_priority == priority and other < value):
+                break
+
+            heap[index] = other
+            position[other] = index
+            index = parent
+
+        heap[index] = value
+        position[value] = index
+
+    def _sift_down(self, index: int):
+        heap, position, priorities = self.heap, self._position, self._priority
+        size = len(heap)
+        value = heap[index]
+        priority = priorities[value]
+
+        while True:
+            child = 2 * index + 1
+            if child >= size:
+                break
+
+            # Smaller of the two children
+            child_priority = priorities[heap[child]]
+            right = child + 1
+            if right < size:
+                right_priority = priorities[heap[right]]
+                if right_priority < child_priority or \
+                        (right_priority == child_priority
+                         and heap[right] < heap[child]):
+                    child, child_priority = right, right_priority
+
+            other = heap[child]
+            if priority < child_priority or \
+                    (priority == child_priority and value < other):
+                break
+
+            heap[index] = other
+            position[other] = index
+            index = child
+
+        heap[index] = value
+        position[value] = index
+
+    def __contains__(self, value: int):
+        return self._position[value] >= 0
+
+    def __len__(self):
+        return len(self.heap)
+
+
+class BucketQueue:
+    def __init__(self, size: int, iterable=None):
+        """Bucket queue of values 0 to size - 1 (cell IDs) with
+        non-negative integer priorities
+
+        Values are kept in one bucket per priority, and popped from the
+        lowest non-empty bucket, last in first out. Priorities of the
+        non-empty buckets are kept in a heap, which holds a few distinct
+        integer levels only, and handles priorities lower than the last
+        popped one (e.g. risk-weighted heuristics). Adding a queued value
+        moves it to the bucket of its new priority, the entry left in the
+        old bucket is skipped when reached. Suited to integer costs, e.g.
+        Manhattan distances scaled by discrete risk levels.
+
+        Parameters
+        ----------
+        size : int
+            Number of values, e.g. number of cells of the grid
+        iterable : optional
+            Values queued with priority 0, by default None
+        """
+        self.buckets = {}
+        # Priorities of the non-empty buckets
+        self._keys = []
+        # Priority of each queued value, -1 if not queued
+        self._priority = [-1] * size
+        self._size = 0
+
+        if iterable is not None:
+            for value in iterable:
+                self.add(value)
+
+    def add(self, value: int, priority: int = 0):
+        """Add, or update the priority of a queued value
+
+        Parameters
+        ----------
+        value : int
+        priority : int, optional
+            Non-negative integer, by default 0
+        """
+        if priority < 0 or priority != int(priority):
+            raise ValueError("Bucket queue priorities must be non-negative "
+                             f"integers, got {priority}")
+        priority = int(priority)
+
+        current = self._priority[value]
+        if current == priority:
+            return
+        if current < 0:
+            self._size += 1
+
+        self._priority[value] = priority
+
+        bucket = self.buckets.get(priority)
+        if bucket is None:
+            self.buckets[priority] = [value]
+            heappush(self._keys, priority)
+        else:
+            bucket.append(value)
+
+    def pop(self) -> int:
+        if not self._size:
+            raise IndexError("pop from an empty bucket queue")
+
+        priorities = self._priority
+        while True:
+            priority = self._keys[0]
+            bucket = self.buckets[priority]
+
+            while bucket:
+                value = bucket.pop()
+                # Entries left behind by priority updates are skipped
+                if priorities[value] == priority:
+                    priorities[value] = -1
+                    self._size -= 1
+
+                    if not bucket:
+                        del self.buckets[priority]
+                        heappop(self._keys)
+                    return value
+
+            del self.buckets[priority]
+            heappop(self._keys)
+
+    def __contains__(self, value: int):
+        return self._priority[value] >= 0
+
+    def __len__(self):
+        return self._size
@@ -1,18 +1,38 @@
-import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import timedelta
-from bson import json_util
-from fastapi import FastAPI, HTTPException
-import redis
+from fastapi import FastAPI, HTTPException, Response
 import logging
 from src.config import settings
 
-from .schemas import SensorInput1
+from .schemas import SensorChunk, SensorInput1
 from .get_db import connect_to_dabase, clear_redis_cache
-from .risks import Risk, update_risks
-from .utils import requests_retry_session
-
-app = FastAPI()
-redis_client = redis.Redis(host=settings.redis_host)
+from .risks import Risk, map_registry, update_risks
+from .inventory import load_inventory_async
+from .connections import connections
+from .utils import async_request_with_retries
+from .parallel import shutdown_process_pool
+from .codec import INVENTORY_MAGIC, as_risk_array, encode_risks, is_encoded
+from .metrics import CACHE_REQUESTS, CallbackCounter, registry, span
+from .streaming import (StreamConflictError, append_chunk, clear_streams,
+                        load_streams, save_oscillators)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Connection pools shared by all requests
+    connections.open()
+    # Bounded pool for risk computations, off the event loop
+    app.state.compute_executor = ThreadPoolExecutor(
+        max_workers=settings.compute_workers, thread_name_prefix="risk")
+    yield
+    app.state.compute_executor.shutdown()
+    shutdown_process_pool()
+    await connections.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 logging.basicConfig(level=logging.DEBUG, filemode="w",
                     format="%(asctime)s - %(levelname)s - %(message)s")
@@ -20,11 +40,25 @@ logging.basicConfig(level=logging.DEBUG, filemode="w",
 MAP_A = "2-Navigation_map_v1.0"
 MAP_B = "2-NavigationFile"
 
+CallbackCounter(
+    registry, "map_cache_requests_total", "Lookups of maps in memory",
+    ("result",), lambda: dict(
+        ((result,), map_registry.stats()[key])
+        for result, key in (("hit", "hits"), ("miss", "misses"))))
+
+
+async def run_compute(func, *args):
+    """Runs blocking or CPU-bound work in the compute pool"""
+    executor = getattr(app.state, "compute_executor", None)
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, func, *args)
 
-def cache_data(key, data, seconds=60):
+
+async def cache_data(key, data: bytes, seconds=60):
     try:
-        serialized_data = json.dumps({key: data})
-        redis_client.setex(key, timedelta(seconds=seconds), serialized_data)
+        with span("cache_write"):
+            await connections.get_async_redis().setex(
+                key, timedelta(seconds=seconds), data)
 
     except Exception as e:
         logging.error("Error caching data: %s", str(e))
@@ -56,7 +90,7 @@ def _get_map_name(map_name):
 @app.get("/clear-cache")
 def clear_cache():
     try:
-        return clear_redis_cache(redis_client)
+        return clear_redis_cache(connections.get_redis())
     except HTTPException as e:
         return e
 
@@ -65,16 +99,23 @@ def clear_cache():
 def index():
     # to test db connection
     try:
-        connect_to_dabase("rossini", redis_client)
+        connect_to_dabase("rossini", connections.get_redis())
         return {"message": "connected"}
     except HTTPException as e:
         return e
 
 
+@app.get("/metrics")
+def get_metrics():
+    return Response(content=registry.render(),
+                    media_type="text/plain; version=0.0.4")
+
+
 @app.get("/rossini_api")
-def index_rossini_api():
+async def index_rossini_api():
     try:
-        response = requests_retry_session().get(
+        response = await async_request_with_retries(
+            connections.get_async_http(), "GET",
             f'http://{settings.navigation_ip_address}:{settings.navigation_port}',
             timeout=5
         )
@@ -88,39 +129,87 @@ def index_rossini_api():
         return {"message": response.status_code}
 
 
+def _compute_risks(sensor_input: dict, redis_inventory_key: str, inventory,
+                   risk_cache):
+    # Runs in the compute pool
+    risk = Risk(sensor_input, redis_inventory_key, connections.get_redis(),
+                inventory=inventory)
+
+    if risk.inventory_cache_exists:
+        risk.compute_risks_from_cached_db()
+    else:
+        risk.compute_risks()
+
+    risk.combine_structural_risks(risk_cache)
+    return risk
+
+
+async def _get_inventory(map_name: str, redis_inventory_key: str):
+    """Cached (encoded) inventory, loaded from the database otherwise"""
+    key = "inventory_" + redis_inventory_key
+
+    try:
+        cache = await connections.get_async_redis().get(key)
+        if is_encoded(cache, INVENTORY_MAGIC):
+            CACHE_REQUESTS.inc(cache="inventory", result="hit")
+            logging.info("Connected to cached inventory database")
+            return cache
+    except Exception as e:
+        logging.error(e.__class__.__name__, exc_info=True)
+
+    CACHE_REQUESTS.inc(cache="inventory", result="miss")
+
+    entry = await run_compute(map_registry.get, map_name)
+    db = connections.get_async_mongo()[settings.database_name]
+    with span("inventory_load"):
+        return await load_inventory_async(db, entry.grid["scene_name"])
+
+
 async def _calculate_risks(sensor_input: dict):
     # get map name
     sensor_input["map_name"], redis_inventory_key = _get_map_name(
         sensor_input["map_name"])
 
-    # Run risk calculations
-    risk = Risk(sensor_input, redis_inventory_key, redis_client)
+    with span("cache_fetch"):
+        inventory, risk_cache = await asyncio.gather(
+            _get_inventory(sensor_input["map_name"], redis_inventory_key),
+            connections.get_async_redis().get("structural_risk"),
+        )
 
-    if risk.inventory_cache_exists:
-        risk.compute_risks_from_cached_db()
-        risk.combine_structural_risks_with_cached()
-
-    else:
-        risk.compute_risks()
-        risk.combine_structural_risks_with_cached()
+    # Run risk calculations, including the wait for a worker
+    with span("compute"):
+        risk = await run_compute(_compute_risks, sensor_input,
+                                 redis_inventory_key, inventory, risk_cache)
 
+    if not risk.inventory_cache_exists:
         # Cache
-        cache_data("inventory_" + redis_inventory_key,
-                   json_util.dumps(risk.inventory_cache), seconds=86400)
+        await cache_data("inventory_" + redis_inventory_key,
+                         risk.inventory_serialized, seconds=86400)
+
+    return risk.risks, risk.structure_mask
 
-    return risk.risks, risk.indices_structure
+
+def _to_response(content):
+    # Payload sent to the navigation app, already encoded
+    if isinstance(content, bytes):
+        return Response(content=content, media_type="application/json")
+    return content
 
 
 @app.put("/risks")
 async def put_risks(sensor_input: SensorInput1):
+    with span("request"):
+        return await _put_risks(sensor_input.model_dump())
+
 
-    sensor_input = sensor_input.model_dump()
+async def _put_risks(sensor_input: dict):
 
     # Structural risk
-    structural_risk, indices_structure = await _calculate_risks(sensor_input)
+    structural_risk, structure_mask = await _calculate_risks(sensor_input)
 
     # Cache
-    cache_data("structural_risk", structural_risk, seconds=3600)
+    await cache_data("structural_risk", encode_risks(
+        structural_risk, settings.cache_compression), seconds=3600)
 
     # Ambiental risk
     ambiental_risk = sensor_input["ambiental_risk"]
@@ -132,19 +221,65 @@ async def put_risks(sensor_input: SensorInput1):
                          f"structural: {len(structural_risk)}")
 
     if ambiental_risk is not None:
+        ambiental_risk = as_risk_array(ambiental_risk)
 
-        cache_data("ambiental_risk", ambiental_risk, seconds=3600)
+        await cache_data("ambiental_risk", encode_risks(
+            ambiental_risk, settings.cache_compression), seconds=3600)
 
-        for idx in indices_structure:
-            ambiental_risk[idx] = 0
+        ambiental_risk[structure_mask] = 0
 
         logging.info("Length of environmental risk values %s",
                      len(ambiental_risk))
-        response = update_risks(structural_risk, ambiental_risk)
-        return response[0]
+        response = await update_risks(structural_risk, ambiental_risk,
+                                      sensor_input["map_name"])
+        return _to_response(response[0])
 
     logging.info("Environmental risks missing")
 
-    response = update_risks(structural_risk, structural_risk)
+    response = await update_risks(structural_risk, structural_risk,
+                                  sensor_input["map_name"])
 
-    return response[0]
+    return _to_response(response[0])
+
+
+@app.put("/sensors/stream")
+async def put_sensor_stream(chunk: SensorChunk):
+    chunk = chunk.model_dump()
+    client = connections.get_async_redis()
+
+    # Running spectra updated with the chunk only
+    try:
+        stream = await append_chunk(
+            client, chunk["name"], chunk["time_step"], chunk["location"],
+            chunk["offset"], chunk["accelerations"])
+    except StreamConflictError as e:
+        # Gap, duplicate or changed time step within the event
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if not chunk["refresh"]:
+        return {"name": stream.name, "samples": stream.n_samples,
+                "pga": stream.pga}
+
+    with span("request"):
+        streams = await load_streams(client)
+        tracked = [sensor.periods for sensor in streams]
+
+        response = await _put_risks({
+            "sensors": [sensor.to_sensor() for sensor in streams],
+            "ambiental_risk": chunk["ambiental_risk"],
+            "map_name": chunk["map_name"],
+        })
+
+        # Periods tracked by the refresh are not replayed on the next one
+        await asyncio.gather(*(
+            save_oscillators(client, sensor)
+            for sensor, periods in zip(streams, tracked)
+            if sensor.periods != periods))
+        return response
+
+
+@app.delete("/sensors/stream")
+async def delete_sensor_streams():
+    # End of the event
+    await clear_streams(connections.get_async_redis())
+    return {"message": "Sensor streams cleared"}
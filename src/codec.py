@@ -0,0 +1,88 @@
+"""
+Binary encoding of cached data
+
+Every payload starts with a magic number and a flags byte
+    risk arrays     uint8 raw bytes, one per cell
+    inventory       msgpack, ObjectIds as strings
+Payloads are optionally zlib-compressed (settings.cache_compression).
+
+Payloads cached by earlier versions (JSON) are not recognized by
+is_encoded, and are recomputed.
+"""
+from typing import Iterable, Union
+import json
+import zlib
+import msgpack
+import numpy as np
+from bson import ObjectId, json_util
+
+RISKS_MAGIC = b"RSK1"
+INVENTORY_MAGIC = b"INV1"
+COMPRESSED = 1
+
+
+def _pack(magic: bytes, payload: bytes, compress: bool) -> bytes:
+    if compress:
+        return magic + bytes([COMPRESSED]) + zlib.compress(payload, 1)
+    return magic + bytes([0]) + payload
+
+
+def _unpack(magic: bytes, data: bytes) -> bytes:
+    if not is_encoded(data, magic):
+        raise ValueError("Unknown cache encoding")
+
+    payload = data[len(magic) + 1:]
+    if data[len(magic)] & COMPRESSED:
+        return zlib.decompress(payload)
+    return payload
+
+
+def is_encoded(data: Union[bytes, str, None], magic: bytes) -> bool:
+    return isinstance(data, bytes) and data[:len(magic)] == magic
+
+
+def as_risk_array(risks: Iterable[int]) -> np.ndarray:
+    """Risk levels of cells as a uint8 array
+
+    Raises
+    ------
+    ValueError
+        Risk levels outside of 0 to 255
+    """
+    risks = np.asarray(risks)
+    if risks.dtype == np.uint8:
+        return risks
+
+    if risks.size and (risks.min() < 0 or risks.max() > 255):
+        raise ValueError("Risk levels must be within 0 and 255")
+
+    return risks.astype(np.uint8)
+
+
+def encode_risks(risks: Iterable[int], compress: bool = False) -> bytes:
+    """Encodes risk levels of cells as uint8 raw bytes"""
+    return _pack(RISKS_MAGIC, as_risk_array(risks).tobytes(), compress)
+
+
+def decode_risks(data: bytes) -> np.ndarray:
+    """Risk levels of cells, uint8 read-only array"""
+    return np.frombuffer(_unpack(RISKS_MAGIC, data), dtype=np.uint8)
+
+
+def _default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    # e.g. dates, as in extended JSON
+    return json.loads(json_util.dumps(obj))
+
+
+def encode_inventory(inventory: dict, compress: bool = False) -> bytes:
+    """Encodes an inventory (component ID: locations, damages and
+    fragilities) with msgpack
+    """
+    return _pack(INVENTORY_MAGIC,
+                 msgpack.packb(inventory, default=_default), compress)
+
+
+def decode_inventory(data: bytes) -> dict:
+    return msgpack.unpackb(_unpack(INVENTORY_MAGIC, data))
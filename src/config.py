@@ -11,6 +11,17 @@ class Settings(BaseSettings):
     redis_host: str = "cache"
     redis_port: str = "6379"
     db_type: str = "local"
+    map_cache_size: int = 4
+    mongo_max_pool_size: int = 100
+    mongo_min_pool_size: int = 0
+    redis_max_connections: int = 50
+    http_pool_maxsize: int = 10
+    compute_workers: int = 4
+    risk_workers: int = 0
+    risk_parallel_min_locations: int = 2000
+    cache_compression: bool = True
+    navigation_delta: bool = False
+    metrics_enabled: bool = True
 
     class Config:
         env_file = "./.env"
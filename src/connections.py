@@ -0,0 +1,122 @@
+"""
+Application-lifetime connections
+
+One pooled MongoClient and one Redis connection pool are shared by all
+requests. They are opened and closed with the
+application (FastAPI lifespan), and lazily on first use otherwise.
+
+Request handlers running on the event loop use the asyncio counterparts
+(motor, redis.asyncio, httpx), created lazily within the running loop.
+Failed HTTP requests are retried by async_request_with_retries only.
+"""
+import logging
+import threading
+import httpx
+import redis
+import redis.asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+
+from src.config import settings
+
+
+if settings.db_type == "local":
+    CONNECTION_STRING = "mongodb://localhost"
+else:
+    CONNECTION_STRING = f"mongodb+srv://{settings.mongo_initdb_root_username}:{settings.mongo_initdb_root_password}" \
+                        f"@cluster0.fnot2.mongodb.net/{settings.database_name}?retryWrites=true"
+
+
+class Connections:
+    def __init__(self):
+        self._mongo = None
+        self._redis = None
+        self._async_mongo = None
+        self._async_redis = None
+        self._async_http = None
+        self._lock = threading.Lock()
+
+    def open(self) -> None:
+        self.get_mongo()
+        self.get_redis()
+        logging.info("Connection pools opened")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._mongo is not None:
+                self._mongo.close()
+            if self._redis is not None:
+                self._redis.connection_pool.disconnect()
+
+            self._mongo = self._redis = None
+        logging.info("Connection pools closed")
+
+    async def aclose(self) -> None:
+        """Closes asyncio and blocking connections"""
+        with self._lock:
+            async_mongo, self._async_mongo = self._async_mongo, None
+            async_redis, self._async_redis = self._async_redis, None
+            async_http, self._async_http = self._async_http, None
+
+        if async_mongo is not None:
+            async_mongo.close()
+        if async_redis is not None:
+            await async_redis.connection_pool.disconnect()
+        if async_http is not None:
+            await async_http.aclose()
+
+        self.close()
+
+    def get_mongo(self) -> MongoClient:
+        with self._lock:
+            if self._mongo is None:
+                self._mongo = MongoClient(
+                    CONNECTION_STRING,
+                    maxPoolSize=settings.mongo_max_pool_size,
+                    minPoolSize=settings.mongo_min_pool_size,
+                )
+            return self._mongo
+
+    def get_redis(self) -> redis.Redis:
+        with self._lock:
+            if self._redis is None:
+                pool = redis.ConnectionPool(
+                    host=settings.redis_host,
+                    port=int(settings.redis_port),
+                    max_connections=settings.redis_max_connections,
+                )
+                self._redis = redis.Redis(connection_pool=pool)
+            return self._redis
+
+    def get_async_mongo(self) -> AsyncIOMotorClient:
+        with self._lock:
+            if self._async_mongo is None:
+                self._async_mongo = AsyncIOMotorClient(
+                    CONNECTION_STRING,
+                    maxPoolSize=settings.mongo_max_pool_size,
+                    minPoolSize=settings.mongo_min_pool_size,
+                )
+            return self._async_mongo
+
+    def get_async_redis(self) -> redis.asyncio.Redis:
+        with self._lock:
+            if self._async_redis is None:
+                pool = redis.asyncio.ConnectionPool(
+                    host=settings.redis_host,
+                    port=int(settings.redis_port),
+                    max_connections=settings.redis_max_connections,
+                )
+                self._async_redis = redis.asyncio.Redis(connection_pool=pool)
+            return self._async_redis
+
+    def get_async_http(self) -> httpx.AsyncClient:
+        with self._lock:
+            if self._async_http is None:
+                self._async_http = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_keepalive_connections=settings.http_pool_maxsize),
+                )
+            return self._async_http
+
+
+connections = Connections()
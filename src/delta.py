@@ -0,0 +1,126 @@
+"""
+Delta-encoded risk map push to the navigation app
+
+The last risk map acknowledged by the navigation app is kept in Redis per
+map and floor, with its version, so that all API workers share it. A new
+risk map is sent as the cells that changed since then
+    PATCH /map
+    {"personal_protection_equipment": ..., "base_version": 4, "version": 5,
+     "map": [{"floor": 0, "cells": [12, 13], "risk_values": [3, 0]}]}
+The navigation app applies a delta only on top of base_version, and
+rejects it otherwise (any non-2xx status). The full map is sent instead
+(PUT /map with "version") when there is no baseline, a delta is rejected,
+or a delta would not be smaller than the full map.
+
+Opt-in with the NAVIGATION_DELTA setting.
+"""
+import logging
+from typing import Optional, Tuple
+import httpx
+import numpy as np
+import orjson
+import redis.asyncio
+
+from .codec import decode_risks, encode_risks
+from .utils import async_request_with_retries
+
+BASELINE_KEY = "navigation_baseline_{}_{}"
+VERSION_KEY = "navigation_version_{}"
+# Baselines expire when no map is pushed for a day
+BASELINE_SECONDS = 86400
+
+
+def get_delta(previous: np.ndarray,
+              current: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Cell IDs that changed, and their new risk levels"""
+    cells = np.flatnonzero(previous != current)
+    return cells, current[cells]
+
+
+async def load_baseline(client: redis.asyncio.Redis, map_name: str,
+                        floor: int) -> Optional[Tuple[int, np.ndarray]]:
+    """Version and risk map last acknowledged by the navigation app"""
+    baseline = await client.hgetall(BASELINE_KEY.format(map_name, floor))
+    if b"version" not in baseline or b"risks" not in baseline:
+        return None
+
+    return int(baseline[b"version"]), decode_risks(baseline[b"risks"])
+
+
+async def save_baseline(client: redis.asyncio.Redis, map_name: str,
+                        floor: int, version: int, risks: np.ndarray) -> None:
+    key = BASELINE_KEY.format(map_name, floor)
+    await client.hset(key, mapping={"version": version,
+                                    "risks": encode_risks(risks)})
+    await client.expire(key, BASELINE_SECONDS)
+
+
+async def push_risks(http: httpx.AsyncClient, client: redis.asyncio.Redis,
+                     url: str, out: dict, risks: np.ndarray, map_name: str,
+                     floor: int = 0, **kwargs) -> httpx.Response:
+    """Pushes the risk map of a floor as a delta, or in full
+
+    Parameters
+    ----------
+    http : httpx.AsyncClient
+        Client of the navigation app
+    client : redis.asyncio.Redis
+        Redis client holding the baselines
+    url : str
+        Map endpoint of the navigation app
+    out : dict
+        Full payload, risk_values of every floor
+    risks : np.ndarray
+        Risk map of the floor sent as delta
+    map_name : str
+        Map name
+    floor : int, optional
+        Floor sent as delta, by default 0
+    **kwargs
+        Passed to the requests, e.g. headers, timeout
+
+    Returns
+    -------
+    httpx.Response
+        Response of the last request
+    """
+    version = await client.incr(VERSION_KEY.format(map_name))
+    baseline = await load_baseline(client, map_name, floor)
+
+    if baseline is not None and len(baseline[1]) == len(risks):
+        base_version, previous = baseline
+        cells, values = get_delta(previous, risks)
+
+        if 2 * len(cells) < len(risks):
+            delta = {
+                "personal_protection_equipment":
+                    out["personal_protection_equipment"],
+                "base_version": base_version,
+                "version": version,
+                "map": [{"floor": floor, "cells": cells,
+                         "risk_values": values}],
+            }
+            response = await async_request_with_retries(
+                http, "PATCH", url, content=orjson.dumps(
+                    delta, option=orjson.OPT_SERIALIZE_NUMPY), **kwargs)
+
+            if response.is_success:
+                logging.info("Risk map delta pushed, %s cells", len(cells))
+                await save_baseline(client, map_name, floor, version, risks)
+                return response
+
+            logging.warning("Risk map delta rejected (%s), full resync",
+                            response.status_code)
+
+    response = await async_request_with_retries(
+        http, "PUT", url, content=orjson.dumps(
+            {**out, "version": version},
+            option=orjson.OPT_SERIALIZE_NUMPY), **kwargs)
+
+    if response.is_success:
+        await save_baseline(client, map_name, floor, version, risks)
+    else:
+        # State of the navigation app is unknown
+        await client.delete(BASELINE_KEY.format(map_name, floor))
+
+    return response
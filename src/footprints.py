@@ -0,0 +1,201 @@
+"""
+Spatial footprint index of a component inventory on a map
+
+Component locations change rarely, so the cells of every component
+rectangle and influence zone, along with the fragility data of every
+component, are computed once per inventory version and map. At request
+time only the risk level of each location is computed and scattered into
+the grid.
+"""
+from hashlib import sha1
+import io
+import re
+from typing import Iterable, Union
+import numpy as np
+
+from .raster import get_footprint_bounds, rasterize
+
+
+def get_intensity_measure(fragility: dict):
+    """Period and damping of the intensity measure of a fragility function,
+    e.g. PGA, or SA(0.5s, 5%)
+    """
+    imName = fragility["imName"]
+
+    if imName.lower() == "pga":
+        return 0.0, 0.02
+
+    imName = re.findall(r"\d+(?:\.\d+)?", imName)
+
+    period = float(imName[0])
+    damping = float(imName[1]) / 100
+    return period, damping
+
+
+def get_inventory_version(serialized_inventory: Union[bytes, str],
+                          *parameters) -> str:
+    """Version of an inventory, hash of its serialized form and of the
+    parameters the index depends on (e.g. map geometry, structure IDs)
+    """
+    if isinstance(serialized_inventory, str):
+        serialized_inventory = serialized_inventory.encode()
+
+    digest = sha1(serialized_inventory)
+    digest.update(repr(parameters).encode())
+    return digest.hexdigest()
+
+
+class FootprintIndex:
+    # Per location, per component, and per cell arrays
+    ARRAYS = (
+        "component", "center_h", "center_v",
+        "mean", "dispersion", "period", "damping", "is_structure",
+        "cells", "owner", "influence_cells", "influence_owner",
+    )
+
+    def __init__(self, **arrays):
+        """Footprint index
+
+        Parameters
+        ----------
+        component : np.ndarray
+            Component index of every location
+        center_h, center_v : np.ndarray
+            Centroid of every location in cm
+        mean, dispersion : np.ndarray
+            Critical damage state of every component
+        period, damping : np.ndarray
+            Intensity measure of every component
+        is_structure : np.ndarray
+            Is every component a structure?
+        cells, owner : np.ndarray
+            Cell IDs of rectangles, location index of each cell
+        influence_cells, influence_owner : np.ndarray
+            Cell IDs of influence zones, location index of each cell
+        """
+        for name in self.ARRAYS:
+            setattr(self, name, np.asarray(arrays[name]))
+
+    def __len__(self):
+        return len(self.component)
+
+    @classmethod
+    def build(cls, collection: dict, structure_ids: Iterable[str],
+              columns: int, n_cells: int, ref_h: float, ref_v: float,
+              cell_size: float) -> "FootprintIndex":
+        """Builds the index of an inventory
+
+        Parameters
+        ----------
+        collection : dict
+            Inventory, component ID: locations, damages and fragilities
+        structure_ids : Iterable[str]
+            IDs of structural components
+        columns : int
+            Number of columns of the grid
+        n_cells : int
+            Number of cells of the grid
+        ref_h, ref_v : float
+            Coordinates of center of cell 0 in cm
+        cell_size : float
+            Cell size in cm
+
+        Returns
+        -------
+        FootprintIndex
+        """
+        structure_ids = set(structure_ids)
+        components = dict((name, []) for name in (
+            "mean", "dispersion", "period", "damping", "is_structure"))
+        component, locations = [], []
+
+        for index, item in enumerate(collection):
+            # Critical damage state
+            ds = collection[item]["damages"][0]
+            period, damping = get_intensity_measure(
+                collection[item]["fragilities"])
+
+            components["mean"].append(ds["mean"])
+            components["dispersion"].append(ds["dispersion"])
+            components["period"].append(period)
+            components["damping"].append(damping)
+            components["is_structure"].append(str(item) in structure_ids)
+
+            for location in collection[item]["locations"]:
+                component.append(index)
+                locations.append(location)
+
+        top_left = np.array([location["topLeft"] for location in locations],
+                            dtype=float).reshape(-1, 2)
+        bottom_right = np.array(
+            [location["bottomRight"] for location in locations],
+            dtype=float).reshape(-1, 2)
+        influence_radius = np.array(
+            [location["influenceRadius"] for location in locations],
+            dtype=float)
+
+        cells, owner = rasterize(*get_footprint_bounds(
+            top_left, bottom_right, np.zeros(len(locations)),
+            ref_h, ref_v, cell_size), columns, n_cells)
+        influence_cells, influence_owner = rasterize(*get_footprint_bounds(
+            top_left, bottom_right, influence_radius,
+            ref_h, ref_v, cell_size, clip=True), columns, n_cells)
+
+        return cls(
+            component=np.array(component, dtype=np.int64),
+            center_h=(top_left[:, 0] + bottom_right[:, 0]) / 2,
+            center_v=(top_left[:, 1] + bottom_right[:, 1]) / 2,
+            mean=np.array(components["mean"], dtype=float),
+            dispersion=np.array(components["dispersion"], dtype=float),
+            period=np.array(components["period"], dtype=float),
+            damping=np.array(components["damping"], dtype=float),
+            is_structure=np.array(components["is_structure"], dtype=bool),
+            cells=cells, owner=owner,
+            influence_cells=influence_cells, influence_owner=influence_owner,
+        )
+
+    def take(self, start: int, stop: int) -> "FootprintIndex":
+        """Index of the locations start to stop (not included), component
+        arrays are kept whole
+        """
+        arrays = dict((name, getattr(self, name)) for name in self.ARRAYS)
+
+        for name in ("component", "center_h", "center_v"):
+            arrays[name] = arrays[name][start:stop]
+
+        # Cells are sorted by location
+        for cells, owner in (("cells", "owner"),
+                             ("influence_cells", "influence_owner")):
+            lo, hi = np.searchsorted(arrays[owner], [start, stop])
+            arrays[cells] = arrays[cells][lo:hi]
+            arrays[owner] = arrays[owner][lo:hi] - start
+
+        return FootprintIndex(**arrays)
+
+    def scatter(self, grid: np.ndarray, risk_levels: np.ndarray) -> None:
+        """Scatters risk levels of the locations into the grid (maximum),
+        influence zones take the risk level reduced by 3
+        """
+        risk_levels = np.asarray(risk_levels, dtype=int)
+
+        influence_risk = np.maximum(risk_levels - 3, 0).astype(grid.dtype)
+        risk_levels = risk_levels.astype(grid.dtype)
+
+        np.maximum.at(grid, self.influence_cells,
+                      influence_risk[self.influence_owner])
+        np.maximum.at(grid, self.cells, risk_levels[self.owner])
+
+    def structure_cells(self) -> np.ndarray:
+        """Cell IDs of rectangles of structural components"""
+        return self.cells[self.is_structure[self.component[self.owner]]]
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        np.savez(buffer, **dict(
+            (name, getattr(self, name)) for name in self.ARRAYS))
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "FootprintIndex":
+        with np.load(io.BytesIO(data)) as arrays:
+            return cls(**dict((name, arrays[name]) for name in cls.ARRAYS))
@@ -0,0 +1,68 @@
+"""
+Fragility functions evaluated for many component locations at once
+
+Lognormal fragility P[DS | IM] = Phi(ln(IM / mean) / dispersion), linearly
+interpolated over a grid of intensity levels, mapped to risk levels
+"""
+import numpy as np
+from scipy.special import ndtr
+
+
+def get_risk_levels(intensities: np.ndarray, means: np.ndarray,
+                    dispersions: np.ndarray, im_range: np.ndarray,
+                    risk_0: float, risk_interval: float) -> np.ndarray:
+    """Risk levels of components given their intensities
+
+    Probability of exceedance is interpolated between the two closest
+    points of the intensity grid, which are evaluated in closed form, so
+    no curve is built per component
+
+    Parameters
+    ----------
+    intensities : np.ndarray
+        Intensity measure levels in the units of the fragility functions
+    means : np.ndarray
+        Means of the fragility functions (critical damage state)
+    dispersions : np.ndarray
+        Dispersions of the fragility functions (critical damage state)
+    im_range : np.ndarray
+        Grid of intensity levels, sorted
+    risk_0 : float
+        Probability of exceedance below which risk is 0
+    risk_interval : float
+        Increment of probability of exceedance per risk level
+
+    Returns
+    -------
+    np.ndarray
+        Risk levels, 0, or 4 to 9
+    """
+    intensities = np.asarray(intensities, dtype=float)
+    means = np.asarray(means, dtype=float)
+    dispersions = np.asarray(dispersions, dtype=float)
+
+    levels = np.zeros(intensities.shape, dtype=int)
+
+    inside = (means != 0) & (intensities != 0) \
+        & (intensities >= im_range[0]) & (intensities <= im_range[-1])
+    levels[(means != 0) & (intensities > im_range[-1])] = 9
+
+    x = intensities[inside]
+    mean = means[inside]
+    dispersion = dispersions[inside]
+
+    # Bracketing points of the intensity grid
+    j = np.clip(np.searchsorted(im_range, x, side="right") - 1,
+                0, len(im_range) - 2)
+    x_lo, x_hi = im_range[j], im_range[j + 1]
+    p_lo = ndtr(np.log(x_lo / mean) / dispersion)
+    p_hi = ndtr(np.log(x_hi / mean) / dispersion)
+
+    p = (p_hi - p_lo) / (x_hi - x_lo) * (x - x_lo) + p_lo
+    # Last point of the grid
+    p = np.where(x == im_range[-1], p_hi, p)
+
+    levels[inside] = np.where(
+        p - risk_0 < 0, 0, np.ceil((p - risk_0) / risk_interval) + 3)
+
+    return levels
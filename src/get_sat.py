@@ -2,6 +2,72 @@ from typing import List, Union
 import numpy as np
 
 
+def _get_time_step(time: List[float], periods: np.ndarray) -> float:
+    dt = time[2] - time[1]
+
+    if dt == 0 and np.all(periods == 0.0):
+        dt = 1e-20
+
+    if dt == 0:
+        raise ValueError("Time step must not be zero!")
+
+    return dt
+
+
+def get_sa_spectrum(acc: Union[List[float], np.ndarray], time: List[float],
+                    periods: Union[List[float], np.ndarray],
+                    damping: Union[float, np.ndarray] = 0.02) -> np.ndarray:
+    """Get the pseudo spectral accelerations of ground motions at a vector of
+    periods (and dampings) in a single FFT pass
+
+    The transfer function of every oscillator is evaluated on the real FFT
+    of the record, broadcasted over all periods, and transformed back at
+    once
+
+    Parameters
+    ----------
+    acc : Union[List[float], np.ndarray]
+        Acceleration time history in [g], a 2D array for multiple records
+        sharing the same time history
+    time : List[float]
+        Time history [s]
+    periods : Union[List[float], np.ndarray]
+        Periods [s] at which we calculate Spectral Acceleration
+    damping : Union[float, np.ndarray], optional
+        Damping ratio, or damping ratios broadcastable to periods,
+        by default 0.02
+
+    Returns
+    -------
+    np.ndarray
+        Spectral accelerations at Periods (Sa(T)) in g, Sa(T=0) = PGA,
+        of shape (number of records, number of periods) for multiple records
+    """
+    acc = np.asarray(acc, dtype=float)
+    periods = np.atleast_1d(np.asarray(periods, dtype=float))
+    periods, damping = np.broadcast_arrays(periods, damping)
+
+    dt = _get_time_step(time, periods)
+    periods = np.where(periods == 0.0, 1e-20, periods)
+
+    # Padded to the next power of two
+    n_points = 2 ** max(1, (acc.shape[-1] - 1).bit_length())
+    fas = np.fft.rfft(acc, n_points)
+    d_freq = 1 / (dt * (n_points - 1))
+    freq = d_freq * np.arange(fas.shape[-1])[:, np.newaxis]
+
+    nat_freq = 1 / periods
+
+    # Transfer function, (frequencies, periods)
+    h = nat_freq ** 2 / ((nat_freq ** 2 - freq ** 2)
+                         + 2j * damping * freq * nat_freq)
+    h[0] = 1
+
+    response = np.fft.irfft(fas[..., np.newaxis] * h, n_points, axis=-2)
+
+    return np.max(np.abs(response), axis=-2)
+
+
 def get_sat(acc: List[float], time: List[float], period: Union[float, np.array], damping: float = 0.02) -> float:
     """Get the pseudo spectral acceleration (Sa(period, damping)) of a ground motion
 
@@ -21,57 +87,9 @@ def get_sat(acc: List[float], time: List[float], period: Union[float, np.array],
     float
         Spectral accelerations at Periods (Sa(T)) in g, Sa(T=0) = PGA
     """
-    dt = time[2] - time[1]
-
-    if isinstance(period, int):
-        period = float(period)
-
-    if dt == 0 and isinstance(period, float) and period == 0.0:
-        dt = 1e-20
+    sa = get_sa_spectrum(acc, time, period, damping)
 
-    if dt == 0 and isinstance(period, float) and period != 0.0:
-        raise ValueError("Time step must not be zero!")
-
-    if isinstance(period, float):
-        if period == 0.0:
-            period = 1e-20
-    else:
-        period[period == 0.0] = 1e-20
+    if np.ndim(period) == 0:
+        return sa[0]
 
-    power = 1
-    while np.power(2, power) < len(acc):
-        power = power + 1
-
-    n_points = np.power(2, power)
-    fas = np.fft.fft(acc, n_points)
-    d_freq = 1 / (dt * (n_points - 1))
-    freq = d_freq * np.array(range(n_points))
-    if n_points % 2 != 0:
-        sym_idx = int(np.ceil(n_points / 2))
-    else:
-        sym_idx = int(1 + n_points / 2)
-
-    nat_freq = 1 / period
-
-    if isinstance(period, float):
-        h = np.ones(len(fas), 'complex')
-    else:
-        h = np.ones((len(fas), len(period)), 'complex')
-
-    h[np.int_(np.arange(1, sym_idx))] = np.array([nat_freq ** 2 * 1 / ((nat_freq ** 2 - i ** 2) + 2 * 1j
-                                                                       * damping * i * nat_freq) for i in freq[1: sym_idx]])
-
-    if n_points % 2 != 0:
-        h[np.int_(np.arange(len(h) - sym_idx + 1, len(h)))
-          ] = np.flipud(np.conj(h[np.int_(np.arange(1, sym_idx))]))
-    else:
-        h[np.int_(np.arange(len(h) - sym_idx + 2, len(h)))
-          ] = np.flipud(np.conj(h[np.int_(np.arange(1, sym_idx - 1))]))
-
-    if isinstance(period, float) or isinstance(period, int):
-        sa = np.max(abs(np.real(np.fft.ifft(np.multiply(h, fas)))))
-    else:
-        sa = np.max(
-            abs(np.real(np.fft.ifft(np.multiply(h, fas[:, np.newaxis]), axis=0))), axis=0)
-        
     return sa
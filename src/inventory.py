@@ -0,0 +1,134 @@
+"""
+Component inventory loader
+
+Fetches components, their locations, their governing (critical) damage
+state and their fragility function with one bulk query per collection,
+instead of one query per component
+"""
+import asyncio
+import re
+
+# Fields of locations used for risk mapping
+LOCATION_PROJECTION = {
+    "component": 1,
+    "topLeft": 1,
+    "bottomRight": 1,
+    "influenceRadius": 1,
+}
+DAMAGE_PROJECTION = {"component": 1, "mean": 1, "dispersion": 1}
+FRAGILITY_PROJECTION = {"component": 1, "imName": 1}
+
+
+def get_coordinates_collection(db, scene_name: str):
+    if bool(re.match('real', scene_name, re.I)):
+        return db["realcoordinates"]
+    return db["coordinates"]
+
+
+def assemble_inventory(component_ids, locations, damages, fragilities):
+    """Groups documents of the inventory collections by component
+
+    Parameters
+    ----------
+    component_ids : Iterable
+        IDs of all components
+    locations : Iterable[dict]
+        Coordinates of components
+    damages : Iterable[dict]
+        Damage states of components
+    fragilities : Iterable[dict]
+        Fragility functions of components
+
+    Returns
+    -------
+    dict
+        Component ID: locations, critical damage state (largest mean) and
+        fragility function, components without locations are skipped
+    """
+    grouped_locations = dict()
+    for location in locations:
+        grouped_locations.setdefault(location["component"], []).append(
+            location)
+
+    critical_damages = dict()
+    for damage in damages:
+        component = damage.pop("component")
+        current = critical_damages.get(component)
+        if current is None or damage["mean"] > current["mean"]:
+            critical_damages[component] = damage
+
+    first_fragilities = dict()
+    for fragility in fragilities:
+        first_fragilities.setdefault(fragility["component"], fragility)
+
+    inventory = dict()
+    for component in component_ids:
+        if component not in grouped_locations:
+            continue
+
+        damage = critical_damages.get(component)
+
+        inventory[str(component)] = {
+            "locations": grouped_locations[component],
+            "damages": [damage] if damage is not None else [],
+            "fragilities": first_fragilities.get(component),
+        }
+
+    return inventory
+
+
+def load_inventory(db, scene_name: str) -> dict:
+    """Loads the component inventory in four round trips
+
+    Parameters
+    ----------
+    db : pymongo.database.Database
+        Inventory database
+    scene_name : str
+        Scene name of the map, real or fictitious coordinates
+
+    Returns
+    -------
+    dict
+        Component ID: locations, damages and fragilities
+    """
+    component_ids = [item["_id"]
+                     for item in db["components"].find({}, {"_id": 1})]
+    query = {"component": {"$in": component_ids}}
+
+    locations = get_coordinates_collection(db, scene_name).find(
+        query, LOCATION_PROJECTION)
+    damages = db["damages"].find(query, DAMAGE_PROJECTION)
+    fragilities = db["fragilities"].find(query, FRAGILITY_PROJECTION)
+
+    return assemble_inventory(component_ids, locations, damages, fragilities)
+
+
+async def load_inventory_async(db, scene_name: str) -> dict:
+    """Loads the component inventory without blocking the event loop, the
+    locations, damages and fragilities are queried concurrently
+
+    Parameters
+    ----------
+    db : motor.motor_asyncio.AsyncIOMotorDatabase
+        Inventory database
+    scene_name : str
+        Scene name of the map, real or fictitious coordinates
+
+    Returns
+    -------
+    dict
+        Component ID: locations, damages and fragilities
+    """
+    component_ids = [item["_id"] async for item in
+                     db["components"].find({}, {"_id": 1})]
+    query = {"component": {"$in": component_ids}}
+
+    locations, damages, fragilities = await asyncio.gather(
+        get_coordinates_collection(db, scene_name).find(
+            query, LOCATION_PROJECTION).to_list(None),
+        db["damages"].find(query, DAMAGE_PROJECTION).to_list(None),
+        db["fragilities"].find(query, FRAGILITY_PROJECTION).to_list(None),
+    )
+
+    return assemble_inventory(component_ids, locations, damages, fragilities)
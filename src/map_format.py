@@ -0,0 +1,174 @@
+"""
+Binary map format
+
+A map is stored as a bundle directory next to its *.json file,
+e.g. maps/2-Navigation_map_v1.0.map/, containing
+    header.json     rows, columns, cell size, safe zones, reference point...
+    offsets.npy     connections in compressed sparse row format, successors
+    neighbors.npy   of cell 'i' are neighbors[offsets[i]:offsets[i + 1]]
+
+Arrays are memory-mapped on loading, so loading does not parse the map and
+the pages are shared between worker processes.
+
+One-time conversion of all *.json maps of a folder:
+    python -m src.map_format maps
+"""
+from pathlib import Path
+import argparse
+import json
+import logging
+import numpy as np
+import yaml
+
+BUNDLE_SUFFIX = ".map"
+HEADER = "header.json"
+ARRAYS = ("offsets", "neighbors")
+VERSION = 1
+
+
+def bundle_path(path: Path, filename: str) -> Path:
+    return Path(path) / (filename + BUNDLE_SUFFIX)
+
+
+def convert_map(path: Path, filename: str, reference: dict = None) -> Path:
+    """Converts a map in json format into a binary bundle
+
+    Parameters
+    ----------
+    path : Path
+        Path of folder containig *.json files of maps
+    filename : str
+        Filename of map without the extension
+    reference : dict, optional
+        Reference point of the map (cell_id, h, v), by default None
+
+    Returns
+    -------
+    Path
+        Path of the bundle
+    """
+    with open(Path(path) / (filename + ".json")) as f:
+        grid = json.load(f)
+
+    cells = grid.pop("cells")
+    if grid["rows"] * grid["columns"] != len(cells):
+        raise ValueError(
+            "Provided grid number of cells not matching rows x columns!")
+
+    degree = np.fromiter((len(cell["connections"]) for cell in cells),
+                         dtype=np.int32, count=len(cells))
+    offsets = np.zeros(len(cells) + 1, dtype=np.int32)
+    np.cumsum(degree, out=offsets[1:])
+    neighbors = np.fromiter(
+        (successor for cell in cells for successor in cell["connections"]),
+        dtype=np.int32, count=int(offsets[-1]))
+
+    if reference is not None:
+        grid["reference"] = reference
+
+    return save_map_bundle(path, filename, grid, offsets, neighbors)
+
+
+def save_map_bundle(path: Path, filename: str, header: dict,
+                    offsets: np.ndarray, neighbors: np.ndarray) -> Path:
+    """Saves a map given in compressed sparse row format as a bundle
+
+    Parameters
+    ----------
+    path : Path
+        Path of folder of map bundles
+    filename : str
+        Filename of map without the extension
+    header : dict
+        Fields of the map other than "cells" (rows, columns...)
+    offsets, neighbors : np.ndarray
+        Connections, successors of cell 'i' are
+        neighbors[offsets[i]:offsets[i + 1]]
+
+    Returns
+    -------
+    Path
+        Path of the bundle
+    """
+    header = {**header, "version": VERSION}
+
+    bundle = bundle_path(path, filename)
+    bundle.mkdir(exist_ok=True)
+
+    np.save(bundle / "offsets.npy", np.asarray(offsets, dtype=np.int32))
+    np.save(bundle / "neighbors.npy", np.asarray(neighbors, dtype=np.int32))
+
+    # Header last, a bundle without a header is never loaded
+    with open(bundle / HEADER, "w") as f:
+        json.dump(header, f)
+
+    return bundle
+
+
+def has_map_bundle(path: Path, filename: str) -> bool:
+    """Is there a bundle of the map, not older than its *.json file"""
+    header = bundle_path(path, filename) / HEADER
+    if not header.is_file():
+        return False
+
+    # An edited json map supersedes its bundle until reconverted
+    filepath = Path(path) / (filename + ".json")
+    if filepath.is_file() and \
+            filepath.stat().st_mtime_ns > header.stat().st_mtime_ns:
+        logging.warning("Map bundle of %s is older than its json file, "
+                        "reading json, reconvert with python -m "
+                        "src.map_format", filename)
+        return False
+
+    return True
+
+
+def load_map_bundle(path: Path, filename: str, mmap_mode: str = "r") -> dict:
+    """Loads a map bundle
+
+    Parameters
+    ----------
+    path : Path
+        Path of folder containig map bundles
+    filename : str
+        Filename of map without the extension
+    mmap_mode : str, optional
+        Memory-map mode of the arrays, by default "r" (read-only)
+
+    Returns
+    -------
+    dict
+        Header fields of the map, as in the *.json file, with "offsets" and
+        "neighbors" arrays in place of "cells"
+    """
+    bundle = bundle_path(path, filename)
+
+    with open(bundle / HEADER) as f:
+        grid = json.load(f)
+
+    if grid.get("version") != VERSION:
+        raise ValueError(f"Unsupported map bundle version of {filename}")
+
+    for name in ARRAYS:
+        grid[name] = np.load(bundle / f"{name}.npy", mmap_mode=mmap_mode)
+
+    return grid
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Converts *.json maps into binary bundles")
+    parser.add_argument("path", type=Path, help="Folder of *.json maps")
+    args = parser.parse_args()
+
+    with open(Path(__file__).resolve().parent / "constants.yaml") as f:
+        references = yaml.safe_load(f).get("REFERENCE", {})
+
+    for filepath in sorted(args.path.glob("*.json")):
+        bundle = convert_map(args.path, filepath.stem,
+                             references.get(filepath.stem))
+        print(f"{filepath.name} -> {bundle.name}")
+
+
+if __name__ == "__main__":
+    main()
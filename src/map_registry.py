@@ -0,0 +1,149 @@
+"""
+Process-wide registry of loaded maps
+
+Holds the parsed grid of each map along with structures derived from it
+(e.g. reference offsets), so that requests skip map I/O after warm-up.
+Bounded LRU, entries are invalidated once the json map or its bundle
+changes on disk.
+"""
+from collections import OrderedDict
+from pathlib import Path
+import os
+import threading
+import time
+from typing import Tuple
+
+from .map_format import bundle_path, HEADER
+from .utils import read_map
+
+
+class MapEntry:
+    def __init__(self, name: str, grid: dict, signature: Tuple):
+        """Loaded map
+
+        Parameters
+        ----------
+        name : str
+            Map name
+        grid : dict
+            Map grid, see read_map
+        signature : Tuple
+            Path, modification time and size of the map files
+        """
+        self.name = name
+        self.grid = grid
+        self.signature = signature
+        self.checked = time.monotonic()
+
+        # Structures derived from the grid, e.g. reference offsets
+        self.derived = dict()
+
+    def get_derived(self, key, factory):
+        """Structure derived from the grid, computed once per entry"""
+        if key not in self.derived:
+            self.derived[key] = factory()
+        return self.derived[key]
+
+
+class MapRegistry:
+    def __init__(self, path: Path, maxsize: int = 4,
+                 check_interval: float = 5.0):
+        """Map registry
+
+        Parameters
+        ----------
+        path : Path
+            Path of folder containig maps
+        maxsize : int, optional
+            Maximum number of maps held, least recently used are evicted,
+            by default 4
+        check_interval : float, optional
+            Seconds between checks of the map file for changes,
+            by default 5.0
+        """
+        self.path = Path(path)
+        self.maxsize = maxsize
+        self.check_interval = check_interval
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def _signature(self, name: str) -> Tuple:
+        # Both files, an edited json map supersedes an older bundle
+        signature = []
+        for filepath in (self.path / (name + ".json"),
+                         bundle_path(self.path, name) / HEADER):
+            if filepath.is_file():
+                stat = os.stat(filepath)
+                signature.append((str(filepath), stat.st_mtime_ns,
+                                  stat.st_size))
+
+        if not signature:
+            raise FileNotFoundError(f"Map {name} not found in {self.path}")
+        return tuple(signature)
+
+    def _is_valid(self, entry: MapEntry) -> bool:
+        now = time.monotonic()
+        if now - entry.checked < self.check_interval:
+            return True
+
+        entry.checked = now
+        try:
+            return self._signature(entry.name) == entry.signature
+        except OSError:
+            return False
+
+    def get(self, name: str) -> MapEntry:
+        """Gets a map, loading it on a miss
+
+        Parameters
+        ----------
+        name : str
+            Map name
+
+        Returns
+        -------
+        MapEntry
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+
+            if entry is not None and self._is_valid(entry):
+                self._entries.move_to_end(name)
+                self.hits += 1
+                return entry
+
+            if entry is not None:
+                del self._entries[name]
+                self.invalidations += 1
+
+            self.misses += 1
+
+            signature = self._signature(name)
+            entry = MapEntry(name, read_map(self.path, name), signature)
+
+            self._entries[name] = entry
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+            return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+        }
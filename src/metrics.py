@@ -0,0 +1,180 @@
+"""
+Latency and cache metrics, exported in Prometheus text format
+
+    with span("fragility"):
+        ...
+    CACHE_REQUESTS.inc(cache="inventory", result="hit")
+
+Stages of PUT /risks are timed into the risk_stage_seconds histogram.
+Metrics are per process. When disabled (settings.metrics_enabled), span
+returns a shared no-op context and counters return immediately.
+"""
+from bisect import bisect_left
+from contextlib import nullcontext
+import threading
+import time
+from typing import Callable, Dict, Iterable, Tuple
+
+from src.config import settings
+
+# Upper bounds of histogram buckets in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+           2.5, 5.0, 10.0)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"'
+                          for name, value in labels.items()) + "}"
+
+
+class Registry:
+    def __init__(self, enabled: bool = True):
+        """Metrics of the process
+
+        Parameters
+        ----------
+        enabled : bool, optional
+            Record metrics, by default True
+        """
+        self.enabled = enabled
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for metric in self._metrics:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.TYPE}")
+                lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+class Counter:
+    TYPE = "counter"
+
+    def __init__(self, registry: Registry, name: str, help: str,
+                 labelnames: Iterable[str] = ()):
+        self._registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = dict()
+        registry.register(self)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if not self._registry.enabled:
+            return
+
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._registry._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for key, value in sorted(self._values.items()):
+            labels = _format_labels(dict(zip(self.labelnames, key)))
+            yield f"{self.name}{labels} {value}"
+
+
+class CallbackCounter(Counter):
+    def __init__(self, registry: Registry, name: str, help: str,
+                 labelnames: Iterable[str],
+                 callback: Callable[[], Dict[Tuple, float]]):
+        """Counter read from another object on export, e.g. statistics of
+        the map registry
+
+        Parameters
+        ----------
+        callback : Callable[[], Dict[Tuple, float]]
+            Label values: value
+        """
+        super().__init__(registry, name, help, labelnames)
+        self._callback = callback
+
+    def samples(self) -> Iterable[str]:
+        self._values = self._callback()
+        return super().samples()
+
+
+class Histogram:
+    TYPE = "histogram"
+
+    def __init__(self, registry: Registry, name: str, help: str,
+                 labelnames: Iterable[str] = (),
+                 buckets: Tuple[float] = BUCKETS):
+        self._registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # Label values: counts per bucket (last is +Inf), sum
+        self._values = dict()
+        registry.register(self)
+
+    def observe(self, value: float, **labels) -> None:
+        if not self._registry.enabled:
+            return
+
+        key = tuple(labels[name] for name in self.labelnames)
+        i = bisect_left(self.buckets, value)
+
+        with self._registry._lock:
+            counts, total = self._values.get(
+                key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self) -> Iterable[str]:
+        for key, (counts, total) in sorted(self._values.items()):
+            labels = dict(zip(self.labelnames, key))
+
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                bucket = _format_labels({**labels, "le": str(bound)})
+                yield f"{self.name}_bucket{bucket} {cumulative}"
+
+            yield f"{self.name}_sum{_format_labels(labels)} {total}"
+            yield f"{self.name}_count{_format_labels(labels)} {cumulative}"
+
+
+class Span:
+    __slots__ = ("stage", "_start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        STAGE_SECONDS.observe(time.perf_counter() - self._start,
+                              stage=self.stage)
+
+
+_NULL_SPAN = nullcontext()
+
+
+def span(stage: str):
+    """Times a stage of PUT /risks, no-op when metrics are disabled"""
+    if not registry.enabled:
+        return _NULL_SPAN
+    return Span(stage)
+
+
+registry = Registry(enabled=settings.metrics_enabled)
+
+STAGE_SECONDS = Histogram(
+    registry, "risk_stage_seconds", "Duration of stages of PUT /risks",
+    ("stage",))
+CACHE_REQUESTS = Counter(
+    registry, "risk_cache_requests_total",
+    "Lookups of cached inventory, structural risk and footprint index",
+    ("cache", "result"))
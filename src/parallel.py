@@ -0,0 +1,206 @@
+"""
+Parallel risk computation across component locations
+
+Locations of the footprint index are sharded across a process pool. The
+sensor records are copied once per request into shared memory, every
+shard computes the intensities, risk levels and risk grid of its
+locations, and the grids of the shards are max-reduced.
+
+Opt-in with the RISK_WORKERS setting, worthwhile for large inventories.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+import threading
+from typing import List, Tuple
+import numpy as np
+
+from .footprints import FootprintIndex
+from .fragility import get_risk_levels
+from .get_sat import get_sa_spectrum
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool(workers: int) -> ProcessPoolExecutor:
+    """Process pool shared by all requests, created on first use"""
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            # Workers are spawned, the API process runs threads
+            _pool = ProcessPoolExecutor(max_workers=workers,
+                                        mp_context=get_context("spawn"))
+        return _pool
+
+
+def shutdown_process_pool() -> None:
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+class SharedSensors:
+    def __init__(self, sensors: List[dict]):
+        """Sensor records in shared memory, acceleration and time series of
+        all sensors concatenated
+
+        Parameters
+        ----------
+        sensors : List[dict]
+            Sensors, "data" is [acceleration series, time series]
+        """
+        lengths = [len(sensor["data"][0]) for sensor in sensors]
+        self.offsets = np.concatenate([[0], np.cumsum(lengths)]).tolist()
+
+        self._shm = SharedMemory(
+            create=True, size=max(2 * self.offsets[-1] * 8, 1))
+        records = np.ndarray((2, self.offsets[-1]), dtype=float,
+                             buffer=self._shm.buf)
+
+        for i, sensor in enumerate(sensors):
+            start, stop = self.offsets[i], self.offsets[i + 1]
+            records[0, start:stop] = sensor["data"][0]
+            records[1, start:stop] = sensor["data"][1][:stop - start]
+
+        del records
+
+    @property
+    def spec(self) -> Tuple[str, List[int]]:
+        """Picklable description to attach to the records"""
+        return self._shm.name, self.offsets
+
+    def close(self) -> None:
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def get_location_intensities(records: List[Tuple], sensor: np.ndarray,
+                             period: np.ndarray,
+                             damping: np.ndarray) -> np.ndarray:
+    """Spectral accelerations at locations, one spectral pass per sensor
+    over the distinct periods and dampings
+
+    Parameters
+    ----------
+    records : List[Tuple]
+        Acceleration and time series of every sensor
+    sensor : np.ndarray
+        Sensor index of every location
+    period, damping : np.ndarray
+        Intensity measure of every location
+
+    Returns
+    -------
+    np.ndarray
+    """
+    intensities = np.zeros(len(sensor))
+
+    for index in np.unique(sensor):
+        at_sensor = sensor == index
+        keys, inverse = np.unique(
+            np.column_stack([period[at_sensor], damping[at_sensor]]),
+            axis=0, return_inverse=True)
+
+        acc, time = records[index]
+        spectrum = get_sa_spectrum(acc, time, keys[:, 0], keys[:, 1])
+        intensities[at_sensor] = spectrum[inverse.ravel()]
+
+    return intensities
+
+
+def _compute_shard(sensors_spec: Tuple[str, List[int]],
+                   index: FootprintIndex, sensor: np.ndarray, n_cells: int,
+                   dtype, im_range: np.ndarray, risk_0: float,
+                   risk_interval: float) -> np.ndarray:
+    # Runs in a worker process
+    name, offsets = sensors_spec
+    shm = SharedMemory(name=name)
+
+    try:
+        data = np.ndarray((2, offsets[-1]), dtype=float, buffer=shm.buf)
+        records = [(data[0, start:stop], data[1, start:stop])
+                   for start, stop in zip(offsets[:-1], offsets[1:])]
+
+        component = index.component
+        active = index.mean[component] != 0
+
+        intensities = np.zeros(len(index))
+        intensities[active] = get_location_intensities(
+            records, sensor[active], index.period[component[active]],
+            index.damping[component[active]])
+
+        del data, records
+
+    finally:
+        shm.close()
+
+    risk_levels = get_risk_levels(
+        intensities, index.mean[component], index.dispersion[component],
+        im_range, risk_0, risk_interval)
+
+    grid = np.zeros(n_cells, dtype=dtype)
+    index.scatter(grid, risk_levels)
+    return grid
+
+
+def compute_risks_parallel(index: FootprintIndex, sensors: List[dict],
+                           sensor: np.ndarray, n_cells: int, dtype,
+                           workers: int, im_range: np.ndarray,
+                           risk_0: float,
+                           risk_interval: float) -> np.ndarray:
+    """Risk grid of the locations of an index, computed by shards in a
+    process pool
+
+    Parameters
+    ----------
+    index : FootprintIndex
+        Footprint index of the inventory
+    sensors : List[dict]
+        Sensors of the request
+    sensor : np.ndarray
+        Closest sensor of every location
+    n_cells : int
+        Number of cells of the grid
+    dtype : np.dtype
+        Data type of the risk grid
+    workers : int
+        Number of processes, and of shards
+    im_range : np.ndarray
+        Grid of intensity levels, sorted
+    risk_0 : float
+        Probability of exceedance below which risk is 0
+    risk_interval : float
+        Increment of probability of exceedance per risk level
+
+    Returns
+    -------
+    np.ndarray
+        Maximum risk level of every cell
+    """
+    pool = get_process_pool(workers)
+    bounds = np.linspace(0, len(index), workers + 1).astype(int)
+
+    with SharedSensors(sensors) as shared:
+        futures = [
+            pool.submit(_compute_shard, shared.spec, index.take(start, stop),
+                        sensor[start:stop], n_cells, dtype, im_range,
+                        risk_0, risk_interval)
+            for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start
+        ]
+
+        risks = np.zeros(n_cells, dtype=dtype)
+        for future in futures:
+            np.maximum(risks, future.result(), out=risks)
+
+    return risks
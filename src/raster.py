@@ -0,0 +1,93 @@
+"""
+Rasterization of component footprints on the map grid
+
+Coordinates of components are in cm with respect to the reference-point,
+footprints are rectangles (topLeft, bottomRight) extended by the influence
+radius for the influence zone. Cell IDs are sequential from left to right,
+top to bottom.
+"""
+from typing import Tuple
+import numpy as np
+
+
+def get_footprint_bounds(top_left: np.ndarray, bottom_right: np.ndarray,
+                         offset: np.ndarray, ref_h: float, ref_v: float,
+                         cell_size: float, clip: bool = False) -> Tuple:
+    """Cell ranges covered by rectangles
+
+    Parameters
+    ----------
+    top_left : np.ndarray
+        Top left coordinates in cm, of shape (n, 2)
+    bottom_right : np.ndarray
+        Bottom right coordinates in cm, of shape (n, 2)
+    offset : np.ndarray
+        Extension of the rectangles on every side in cm, e.g. influence
+        radius, of shape (n,)
+    ref_h : float
+        Horizontal coordinate of center of cell 0 in cm
+    ref_v : float
+        Vertical coordinate of center of cell 0 in cm
+    cell_size : float
+        Cell size in cm
+    clip : bool, optional
+        Clip start of ranges at 0, by default False
+
+    Returns
+    -------
+    Tuple
+        Row start, row end, column start, column end, end not included
+    """
+    top_left = np.asarray(top_left, dtype=float).reshape(-1, 2)
+    bottom_right = np.asarray(bottom_right, dtype=float).reshape(-1, 2)
+    offset = np.asarray(offset, dtype=float)
+
+    x_start = np.floor(
+        np.round(top_left[:, 0] - offset - ref_h) / cell_size)
+    x_end = np.ceil(np.round(bottom_right[:, 0] + offset - ref_h) / cell_size)
+    y_start = np.floor(
+        np.round(top_left[:, 1] - offset - ref_v) / cell_size)
+    y_end = np.ceil(np.round(bottom_right[:, 1] + offset - ref_v) / cell_size)
+
+    if clip:
+        x_start = np.maximum(x_start, 0)
+        y_start = np.maximum(y_start, 0)
+
+    return tuple(bound.astype(np.int64)
+                 for bound in (y_start, y_end, x_start, x_end))
+
+
+def rasterize(y_start: np.ndarray, y_end: np.ndarray, x_start: np.ndarray,
+              x_end: np.ndarray, columns: int,
+              n_cells: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Cell IDs covered by rectangles
+
+    Parameters
+    ----------
+    y_start, y_end, x_start, x_end : np.ndarray
+        Row and column ranges of the rectangles, end not included
+    columns : int
+        Number of columns of the grid
+    n_cells : int
+        Number of cells of the grid, IDs outside of the grid are dropped
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        Cell IDs, index of the rectangle each cell belongs to
+    """
+    height = np.maximum(y_end - y_start, 0)
+    width = np.maximum(x_end - x_start, 0)
+    area = height * width
+
+    owner = np.repeat(np.arange(len(area)), area)
+
+    # Position of every cell within its rectangle
+    local = np.arange(area.sum()) - np.repeat(np.cumsum(area) - area, area)
+    row = y_start[owner] + local // width[owner]
+    column = x_start[owner] + local % width[owner]
+
+    cells = row * columns + column
+    inside = (cells >= 0) & (cells < n_cells)
+
+    return cells[inside], owner[inside]
@@ -6,30 +6,41 @@ Coordinates of Rossini component database are set with respect to reference-poin
 Normalizes coordinates of all components
 and assigns cell IDs
 """
+from datetime import timedelta
 from pathlib import Path
-import math
-from typing import List
+from typing import Union
 import logging
-import json
 import numpy as np
-import re
+import orjson
 import yaml
-from scipy import stats
-from scipy.interpolate import interp1d
 import redis
 
-from .get_sat import get_sat
-from src.utils import read_map, requests_retry_session
+from .get_sat import get_sat, get_sa_spectrum
+from .fragility import get_risk_levels
+from .footprints import (FootprintIndex, get_intensity_measure,
+                         get_inventory_version)
+from .inventory import load_inventory
+from .codec import (RISKS_MAGIC, decode_inventory, decode_risks,
+                    encode_inventory, is_encoded)
+from .parallel import compute_risks_parallel
+from .delta import push_risks
+from .metrics import CACHE_REQUESTS, span
 from src.get_db import connect_to_dabase
+from src.connections import connections
+from src.map_registry import MapRegistry
+from src.utils import async_request_with_retries
 from src.config import settings
 
 # todo, update to connect to Maps on a server
 PATH = Path(__file__).resolve().parent
 PATH_MAPS = PATH.parents[0] / "maps"
 
+map_registry = MapRegistry(PATH_MAPS, maxsize=settings.map_cache_size)
 
-def update_risks(structural: List[int], ambiental: List[int]):
-    combined = [*map(max, zip(structural, ambiental))]
+
+async def update_risks(structural: np.ndarray, ambiental: np.ndarray,
+                       map_name: str = None):
+    combined = np.maximum(structural, ambiental)
 
     headers = {
         'Content-Type': 'application/json',
@@ -42,14 +53,24 @@ def update_risks(structural: List[int], ambiental: List[int]):
                {"floor": 1,
                 "risk_values": [0]}
            ]}
+    body = orjson.dumps(out, option=orjson.OPT_SERIALIZE_NUMPY)
+    url = f'http://{settings.navigation_ip_address}:{settings.navigation_port}/map'
 
     try:
-        response = requests_retry_session().put(
-            f'http://{settings.navigation_ip_address}:{settings.navigation_port}/map',
-            timeout=5,
-            headers=headers,
-            data=json.dumps(out),
-        )
+        with span("push"):
+            if settings.navigation_delta and map_name is not None:
+                # Changed cells only, see delta
+                response = await push_risks(
+                    connections.get_async_http(),
+                    connections.get_async_redis(), url, out, combined,
+                    map_name, timeout=5, headers=headers)
+            else:
+                response = await async_request_with_retries(
+                    connections.get_async_http(), "PUT", url,
+                    timeout=5,
+                    headers=headers,
+                    content=body,
+                )
 
     except Exception as e:
         logging.error(e.__class__.__name__, exc_info=True)
@@ -57,7 +78,7 @@ def update_risks(structural: List[int], ambiental: List[int]):
 
     else:
         logging.info(response.status_code, exc_info=True)
-        return out, response
+        return body, response
 
 
 class Risk:
@@ -102,7 +123,8 @@ class Risk:
 
     inventory_cache = dict()
 
-    def __init__(self, sensor_input: dict, redis_inventory_key: str, client: redis.Redis = None):
+    def __init__(self, sensor_input: dict, redis_inventory_key: str, client: redis.Redis = None,
+                 inventory: Union[bytes, dict] = None):
         """Risk mapping
 
         Parameters
@@ -115,28 +137,40 @@ class Risk:
                 Redis inventory key
         client : redis.Redis, optional
                 Redis Client, by default None
+        inventory : Union[bytes, dict], optional
+                Inventory already fetched by the caller, encoded as
+                cached or loaded from the database, by default None
+                (fetched here)
         """
         
         self._get_constants()
         
         self.client = client
-        self.db, self.inventory_cache_exists = connect_to_dabase(
-            settings.database_name, redis_inventory_key, client=client)
+        if inventory is None:
+            self.db, self.inventory_cache_exists = connect_to_dabase(
+                settings.database_name, redis_inventory_key, client=client)
+        elif isinstance(inventory, bytes):
+            self.db = {"inventory_" + redis_inventory_key: inventory}
+            self.inventory_cache_exists = True
+        else:
+            self.db, self.inventory_cache_exists = None, False
         self.redis_inventory_key = "inventory_" + redis_inventory_key
         self.map_name = sensor_input["map_name"]
-        self.grid = read_map(PATH_MAPS, self.map_name)
+        self.map_entry = map_registry.get(self.map_name)
+        self.grid = self.map_entry.grid
         self.scene_name = self.grid["scene_name"]
 
         # Coordinates of center of cell 0 with respect to (0, 0) = first white pixel
-        self.ref_v, self.ref_h = self._identify_cell_0_position()
+        self.ref_v, self.ref_h = self.map_entry.get_derived(
+            "cell_0_position", self._identify_cell_0_position)
 
         # Risk arrays
         self.risks = self._init_risk_arrays()
 
         self.sensor_input = sensor_input
 
-        # Indexes of structural components
-        self.indices_structure = set()
+        # Cells of structural components
+        self.structure_mask = np.zeros(len(self.risks), dtype=bool)
 
         # Sensors
         try:
@@ -144,6 +178,19 @@ class Risk:
         except KeyError:
             self.sensors = None
 
+        # Spectral accelerations of the request, (sensor, period, damping)
+        self.intensities = dict()
+
+        # Inventory of the request, fetched from the database
+        self.inventory_cache = inventory if isinstance(inventory, dict) \
+            else dict()
+        self.inventory_serialized = None
+
+    @property
+    def indices_structure(self) -> np.ndarray:
+        """Cell IDs of structural components"""
+        return np.flatnonzero(self.structure_mask)
+
     def _get_constants(self):
         
         with open(PATH / "constants.yaml", "r") as f:
@@ -161,13 +208,17 @@ class Risk:
         columns = self.grid["columns"]
         cell_count = rows * columns
 
-        return np.zeros(cell_count, dtype=int)
+        return np.zeros(cell_count, dtype=np.uint8)
 
     def _identify_cell_0_position(self):
-        ref_cell_id = self.REFERENCE[self.map_name]["cell_id"]
-        ref_h = self.REFERENCE[self.map_name]["h"] * \
+        # Reference point stored with a binary map, if not in constants
+        reference = self.REFERENCE.get(self.map_name) \
+            or self.grid["reference"]
+
+        ref_cell_id = reference["cell_id"]
+        ref_h = reference["h"] * \
             self.grid["millimeter_per_pixel"] / 10
-        ref_v = self.REFERENCE[self.map_name]["v"] * \
+        ref_v = reference["v"] * \
             self.grid["millimeter_per_pixel"] / 10
 
         columns = self.grid["columns"]
@@ -180,57 +231,73 @@ class Risk:
 
         return up, left
 
-    def _get_cell_id(self, location):
-        columns = self.grid["columns"]
-        cell_size = self.grid["cell_size_cm"]
-
-        cells = set()
-        influence_cells = set()
-
-        topLeft = location["topLeft"]
-        bottomRight = location["bottomRight"]
-        influenceRadius = location["influenceRadius"]
-
-        # X range, start is included, end is not included
-        x_start = math.floor(round(topLeft[0] - self.ref_h, 0) / cell_size)
-        x_end = math.ceil(round(bottomRight[0] - self.ref_h, 0) / cell_size)
-        # Y range
-        y_start = math.floor(round(topLeft[1] - self.ref_v, 0) / cell_size)
-        y_end = math.ceil(round(bottomRight[1] - self.ref_v, 0) / cell_size)
-
-        for i in range(y_start, y_end):
-            for j in range(x_start, x_end):
-                cells.add(i * columns + j)
-        for i in range(y_start, y_end):
-            for j in range(x_start, x_end):
-                cells.add(i * columns + j)
-
-        # Influence zone
-        x_start = max(0, math.floor(
-            round(topLeft[0] - influenceRadius - self.ref_h, 0) / cell_size))
-        x_end = math.ceil(
-            round(bottomRight[0] + influenceRadius - self.ref_h, 0) / cell_size)
-        y_start = max(0, math.floor(
-            round(topLeft[1] - influenceRadius - self.ref_v, 0) / cell_size))
-        y_end = math.ceil(
-            round(bottomRight[1] + influenceRadius - self.ref_v, 0) / cell_size)
-
-        for i in range(y_start, y_end):
-            for j in range(x_start, x_end):
-                cell_id = i * columns + j
-                if cell_id in cells:
-                    continue
-
-                influence_cells.add(cell_id)
-
-        return list(cells), list(influence_cells), [topLeft, bottomRight]
+    def _get_footprint_index(self, serialized_inventory, collection=None):
+        """Footprint index of the inventory, reused while the inventory and
+        the map do not change (in process, then in Redis), built otherwise
 
-    def compute_earthquake_intensity(self, period, damping, position):
-        if self.sensors is None:
-            return 0
+        Parameters
+        ----------
+        serialized_inventory : bytes
+            Inventory as cached (see codec), identifies the inventory
+            version
+        collection : dict, optional
+            Parsed inventory, by default None (parsed if needed)
+
+        Returns
+        -------
+        FootprintIndex
+        """
+        version = get_inventory_version(
+            serialized_inventory, self.map_name, self.ref_h, self.ref_v,
+            self.grid["columns"], self.grid["cell_size_cm"], len(self.risks),
+            sorted(self.STRUCTURE_IDS))
+
+        cached = self.map_entry.derived.get("footprints")
+        if cached is not None and cached[0] == version:
+            CACHE_REQUESTS.inc(cache="footprint_index", result="hit")
+            return cached[1]
+
+        CACHE_REQUESTS.inc(cache="footprint_index", result="miss")
+
+        redis_key = f"footprints_{self.map_name}_{version}"
+        data = self.client.get(redis_key) if self.client is not None \
+            else None
+
+        if data is not None:
+            CACHE_REQUESTS.inc(cache="footprint_index_redis", result="hit")
+            logging.info("Using cached footprint index")
+            index = FootprintIndex.from_bytes(data)
+
+        else:
+            CACHE_REQUESTS.inc(cache="footprint_index_redis", result="miss")
+            if collection is None:
+                collection = decode_inventory(serialized_inventory)
+
+            index = FootprintIndex.build(
+                collection, self.STRUCTURE_IDS, self.grid["columns"],
+                len(self.risks), self.ref_h, self.ref_v,
+                self.grid["cell_size_cm"])
+
+            if self.client is not None:
+                try:
+                    self.client.setex(redis_key, timedelta(seconds=86400),
+                                      index.to_bytes())
+                except Exception as e:
+                    logging.error("Error caching footprint index: %s", str(e))
+
+        self.map_entry.derived["footprints"] = (version, index)
+        return index
+
+    def _apply_risks(self, index, risk_levels):
+        """Scatters risk levels of component locations into the grid,
+        influence zones take the risk level reduced by 3
+        """
+        index.scatter(self.risks, risk_levels)
+
+    def _get_sensor_indices(self, center_h, center_v):
         if len(self.sensors) == 1:
             # A single sensor was provided
-            return get_sat(self.sensors[0]["data"][0], self.sensors[0]["data"][1], period, damping)
+            return np.zeros(len(center_h), dtype=int)
 
         # Multiple sensors were provided
         n_sensors = len(self.sensors)
@@ -241,159 +308,207 @@ class Risk:
             sensor_location = self.sensors[i]["location"]
             x[i], y[i] = sensor_location
 
+        # Closest sensor to centroid of each rectangular component
+        center_h = np.asarray(center_h, dtype=float)[:, np.newaxis]
+        center_v = np.asarray(center_v, dtype=float)[:, np.newaxis]
+
+        distance = np.sqrt((center_h - x) ** 2 + (center_v - y) ** 2)
+        return np.argmin(distance, axis=1)
+
+    def _get_sensor_index(self, position):
         # Centroid of a rectangular component
         center_h = (position[0][0] + position[1][0]) / 2
         center_v = (position[0][1] + position[1][1]) / 2
 
-        distance = np.sqrt((center_h - x) ** 2 + (center_v - y) ** 2)
-        distance_index = np.argmin(distance)
-        sensor_data = self.sensors[distance_index]
+        return int(self._get_sensor_indices([center_h], [center_v])[0])
 
-        return get_sat(sensor_data["data"][0], sensor_data["data"][1], period, damping)
+    def compute_earthquake_intensity(self, period, damping, position):
+        if self.sensors is None:
+            return 0
 
-    def derive_fragility(self, damage_state, fragility, position):
-        # Fragility function information, Period and Damping
-        imName = fragility["imName"]
+        key = (self._get_sensor_index(position), period, damping)
 
-        if imName.lower() == "pga":
-            period = 0.0
-            damping = 0.02
-        else:
-            imName = re.findall(r"\d+(?:\.\d+)?", imName)
+        if key not in self.intensities:
+            sensor_data = self.sensors[key[0]]
+            if "stream" in sensor_data:
+                self.compute_earthquake_intensities([key])
+            else:
+                self.intensities[key] = get_sat(
+                    sensor_data["data"][0], sensor_data["data"][1], period,
+                    damping)
+
+        return self.intensities[key]
+
+    def compute_earthquake_intensities(self, keys):
+        """Computes the distinct intensity measures of the request at once,
+        a single spectral pass per sensor, or read from the running spectra
+        of streamed sensors (see streaming)
+
+        Parameters
+        ----------
+        keys : Iterable[Tuple[int, float, float]]
+            Sensor index, period and damping
+        """
+        if self.sensors is None:
+            return
+
+        per_sensor = dict()
+        for key in set(keys):
+            if key not in self.intensities:
+                per_sensor.setdefault(key[0], []).append(key)
+
+        for index, sensor_keys in per_sensor.items():
+            sensor_data = self.sensors[index]
+            periods = np.array([key[1] for key in sensor_keys])
+            dampings = np.array([key[2] for key in sensor_keys])
+
+            if "stream" in sensor_data:
+                # Running spectrum of a streamed sensor
+                spectrum = sensor_data["stream"].get_sa_spectrum(
+                    periods, dampings)
+            else:
+                spectrum = get_sa_spectrum(
+                    sensor_data["data"][0], sensor_data["data"][1], periods,
+                    dampings)
+
+            self.intensities.update(zip(sensor_keys, spectrum))
+
+    def _get_location_intensities(self, index):
+        # Intensity at each component location
+        intensities = np.zeros(len(index))
+        if self.sensors is None or len(index) == 0:
+            return intensities
 
-            period = float(imName[0])
-            damping = float(imName[1]) / 100
+        component = index.component
+        active = index.mean[component] != 0
+
+        keys = list(zip(
+            self._get_sensor_indices(index.center_h[active],
+                                     index.center_v[active]).tolist(),
+            index.period[component[active]].tolist(),
+            index.damping[component[active]].tolist()))
+
+        self.compute_earthquake_intensities(keys)
+
+        intensities[active] = [self.intensities[key] for key in keys]
+        return intensities
+
+    get_intensity_measure = staticmethod(get_intensity_measure)
+
+    def derive_fragility(self, damage_state, fragility, position):
+        period, damping = self.get_intensity_measure(fragility)
 
         # Critical damage state
         ds = damage_state[0]
-        mean = ds["mean"]
-        dispersion = ds["dispersion"]
 
-        if mean == 0:
+        if ds["mean"] == 0:
             return 0
 
-        probabilities = stats.norm.cdf(
-            np.log(self.PGA_RANGE / mean) / dispersion, loc=0, scale=1)
-        interpolation = interp1d(self.PGA_RANGE, probabilities)
-
         # Get intensity level
         intensity = self.compute_earthquake_intensity(
             period, damping, position)
 
-        if intensity > max(self.PGA_RANGE):
-            return 9
-        if intensity == 0 or intensity < min(self.PGA_RANGE):
-            return 0
+        return int(self.derive_fragilities(
+            [intensity], [ds["mean"]], [ds["dispersion"]])[0])
 
-        p = interpolation(intensity)
-        if p - self.RISK_0 < 0:
-            return 0
+    def derive_fragilities(self, intensities, means, dispersions):
+        """Risk levels of many component locations at once
 
-        return math.ceil((p - self.RISK_0) / self.RISK_INTERVAL) + 3
+        Parameters
+        ----------
+        intensities : np.ndarray
+            Intensity measure levels
+        means : np.ndarray
+            Means of the critical damage states
+        dispersions : np.ndarray
+            Dispersions of the critical damage states
+
+        Returns
+        -------
+        np.ndarray
+            Risk levels
+        """
+        return get_risk_levels(intensities, means, dispersions,
+                               self.PGA_RANGE, self.RISK_0,
+                               self.RISK_INTERVAL)
 
     def compute_risks_from_cached_db(self):
-        collection = json.loads(self.db[self.redis_inventory_key])
-
-        for item in collection:
-            # Get fragility data
-            damage_state = collection[item]["damages"]
-            fragility = collection[item]["fragilities"]
-
-            # Get locations
-            locations = collection[item]["locations"]
-
-            for location in locations:
-                cells, influence_cells, exact_position = self._get_cell_id(
-                    location)
-
-                # Append into structure's indices
-                if str(item) in self.STRUCTURE_IDS:
-                    self.indices_structure.update(cells)
-
-                # Compute risk
-                risk_level = self.derive_fragility(
-                    damage_state, fragility, exact_position)
+        with span("footprint_index"):
+            index = self._get_footprint_index(
+                self.db[self.redis_inventory_key])
+        self._compute_risks_from_index(index)
+
+    def _compute_risks_from_index(self, index):
+        if self.sensors is not None and settings.risk_workers > 0 \
+                and len(index) >= settings.risk_parallel_min_locations \
+                and all("data" in sensor for sensor in self.sensors):
+            with span("parallel"):
+                self._compute_risks_parallel(index)
+            return
+
+        # Risk level of each location, scattered into the grid
+        with span("intensities"):
+            intensities = self._get_location_intensities(index)
+
+        with span("fragility"):
+            risk_levels = self.derive_fragilities(
+                intensities, index.mean[index.component],
+                index.dispersion[index.component])
+
+        with span("scatter"):
+            self._apply_risks(index, risk_levels)
+
+        self.structure_mask[index.structure_cells()] = True
+
+    def _compute_risks_parallel(self, index):
+        """Risk levels of locations computed by shards of the index in a
+        process pool, opt-in with settings.risk_workers
+        """
+        sensor = self._get_sensor_indices(index.center_h, index.center_v)
 
-                # Get cell IDs
-                cells = np.intersect1d(
-                    cells, np.where(self.risks < risk_level))
-                if len(cells) > 0:
-                    self.risks[cells] = risk_level
+        risks = compute_risks_parallel(
+            index, self.sensors, sensor, len(self.risks), self.risks.dtype,
+            settings.risk_workers, self.PGA_RANGE, self.RISK_0,
+            self.RISK_INTERVAL)
+        np.maximum(self.risks, risks, out=self.risks)
 
-                # Risk at influence zone
-                influence_risk = max(0, risk_level - 3)
-                cells = np.intersect1d(
-                    influence_cells, np.where(self.risks < influence_risk))
-                if len(cells) > 0:
-                    self.risks[cells] = influence_risk
+        self.structure_mask[index.structure_cells()] = True
 
     def compute_risks(self):
-        collection = self.db["components"]
-        damage_states = self.db["damages"]
-        fragilities = self.db["fragilities"]
-
-        if bool(re.match('real', self.scene_name, re.I)):
-            coordinates = self.db["realcoordinates"]
-        else:
-            coordinates = self.db["coordinates"]
-
-        # All components
-        items = collection.find({}, {"_id": 1})
-
-        # For each component
-        for item in items:
-            locations = list(coordinates.find({"component": item["_id"]}))
-
-            if not locations:
-                continue
-
-            item_id = str(item["_id"])
-
-            # Get fragility data
-            damage_state = list(damage_states.find({"component": item["_id"]}, {"mean": 1, "dispersion": 1})
-                                .sort("mean", -1).limit(1))
-            fragility = fragilities.find_one({"component": item["_id"]})
-
-            # Caching
-            self.inventory_cache[item_id] = {
-                "locations": locations,
-                "damages": damage_state,
-                "fragilities": fragility,
-            }
-
-            # If location exists, loop over each location
-            for location in locations:
-                cells, influence_cells, exact_position = self._get_cell_id(
-                    location)
-
-                # Append into structure's indices
-                if item_id in self.STRUCTURE_IDS:
-                    self.indices_structure.update(cells)
-
-                # Calculate risk
-                risk_level = self.derive_fragility(
-                    damage_state, fragility, exact_position)
-
-                # Get cell IDs
-                cells = np.intersect1d(
-                    cells, np.where(self.risks < risk_level))
-                if len(cells) > 0:
-                    self.risks[cells] = risk_level
-
-                # Risk at influence zone
-                influence_risk = max(0, risk_level - 3)
-                cells = np.intersect1d(
-                    influence_cells, np.where(self.risks < influence_risk))
-                if len(cells) > 0:
-                    self.risks[cells] = influence_risk
+        if self.db is not None:
+            with span("inventory_load"):
+                self.inventory_cache = load_inventory(
+                    self.db, self.scene_name)
+
+        self.inventory_serialized = encode_inventory(
+            self.inventory_cache, compress=settings.cache_compression)
+        with span("footprint_index"):
+            index = self._get_footprint_index(
+                self.inventory_serialized, self.inventory_cache)
+        self._compute_risks_from_index(index)
 
     def combine_structural_risks_with_cached(self):
+        self.combine_structural_risks(self.client.get("structural_risk"))
 
-        self.risks = self.risks.tolist()
+    def combine_structural_risks(self, risk_cache):
+        """Combines with the structural risk cached by a previous request
 
-        risk_cache = self.client.get("structural_risk")
-        if risk_cache is not None:
-            logging.info("Combining with cached structural risk")
-
-            structural_risk_cache = json.loads(risk_cache)['structural_risk']
-            self.risks = list(map(max, zip(self.risks, structural_risk_cache)))
+        Parameters
+        ----------
+        risk_cache : Union[bytes, None]
+            Cached "structural_risk" (see codec), None if missing
+        """
+        if not is_encoded(risk_cache, RISKS_MAGIC):
+            CACHE_REQUESTS.inc(cache="structural_risk", result="miss")
+            return
+
+        structural_risk_cache = decode_risks(risk_cache)
+        if len(structural_risk_cache) != len(self.risks):
+            CACHE_REQUESTS.inc(cache="structural_risk", result="miss")
+            logging.warning("Cached structural risk of another map ignored")
+            return
+
+        CACHE_REQUESTS.inc(cache="structural_risk", result="hit")
+        logging.info("Combining with cached structural risk")
+        with span("combine"):
+            self.risks = np.maximum(self.risks, structural_risk_cache)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, root_validator, validator
-from typing import List
+from typing import List, Tuple
 
 
 class Floor(BaseModel):
@@ -54,3 +54,30 @@ class SensorInput1(BaseModel):
     sensors: List[SensorData1] = None
     ambiental_risk: List[int] = None
     map_name: str = None
+
+
+class SensorChunk(BaseModel):
+    name: str
+    # Accelerations in [g] following the previous chunk of the sensor
+    accelerations: List[float]
+    # Index of the first sample of the chunk in the record
+    offset: int
+    time_step: float
+    # Coordinates of the sensor, required to map the streams on refresh
+    location: Tuple[float, float]
+    # Refresh risks with the records received so far
+    refresh: bool = False
+    ambiental_risk: List[int] = None
+    map_name: str = None
+
+    @validator('time_step')
+    def is_time_step_positive(cls, v):
+        if v <= 0:
+            raise ValueError("Time step must be positive")
+        return v
+
+    @validator('offset')
+    def is_offset_positive(cls, v):
+        if v < 0:
+            raise ValueError("Offset must be non-negative")
+        return v
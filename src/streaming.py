@@ -0,0 +1,378 @@
+"""
+Streaming sensor records and running response spectra
+
+Acceleration chunks of a sensor are fed, as they arrive, to SDOF
+oscillators integrated with the piecewise-exact recursion of Nigam and
+Jennings (1969), exact for linearly interpolated ground motion. Each
+oscillator keeps its state and the running peak of its displacement, so
+a chunk costs O(chunk length) per tracked period, and Sa = wn^2 * max|u|
+is available at any time without reprocessing the history.
+
+The history is kept to start tracking new periods (e.g. a new fragility
+function) mid-event.
+
+Streams are kept in Redis, so that the chunks of a sensor can reach any
+API worker: a hash with the time step, location, PGA, number of samples
+and oscillator states per sensor, and the history as appended float64
+bytes. Each chunk carries the offset of its first sample, and is applied
+only if it follows the samples stored so far.
+"""
+import threading
+from typing import Iterable, List, Optional, Tuple, Union
+import numpy as np
+import orjson
+import redis.asyncio
+from redis.exceptions import WatchError
+from scipy.signal import lfilter
+
+STREAM_KEY = "sensor_stream_{}"
+HISTORY_KEY = "sensor_stream_history_{}"
+STREAMS_KEY = "sensor_streams"
+# Streams expire when no chunk is received for a day
+STREAM_SECONDS = 86400
+# Attempts of a chunk while other requests update the same stream
+STREAM_RETRIES = 5
+
+
+class StreamConflictError(ValueError):
+    """Chunk does not follow the stream, e.g. a gap or a changed time step"""
+
+
+def get_recursion_filter(period: float, damping: float,
+                         dt: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Relative displacement of an SDOF oscillator as a linear filter of
+    the ground acceleration
+
+    The recursion [u, v]_{k+1} = A [u, v]_k + B [a_k, a_{k+1}] of Nigam and
+    Jennings is written as the transfer function from a to u
+
+    Parameters
+    ----------
+    period : float
+        Natural period [s]
+    damping : float
+        Damping ratio, below 1
+    dt : float
+        Time step [s]
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        Numerator and denominator coefficients, see scipy.signal.lfilter
+    """
+    w = 2 * np.pi / period
+    z = damping
+    sq = np.sqrt(1 - z ** 2)
+    wd = w * sq
+
+    e = np.exp(-z * w * dt)
+    s = np.sin(wd * dt)
+    c = np.cos(wd * dt)
+
+    a11 = e * (z / sq * s + c)
+    a12 = e * s / wd
+    a21 = -w / sq * e * s
+    a22 = e * (c - z / sq * s)
+
+    k1 = (2 * z ** 2 - 1) / (w ** 2 * dt)
+    k2 = 2 * z / (w ** 3 * dt)
+
+    b11 = e * ((k1 + z / w) * s / wd + (k2 + 1 / w ** 2) * c) - k2
+    b12 = -e * (k1 * s / wd + k2 * c) - 1 / w ** 2 + k2
+    b21 = e * ((k1 + z / w) * (c - z / sq * s)
+               - (k2 + 1 / w ** 2) * (wd * s + z * w * c)) + 1 / (w ** 2 * dt)
+    b22 = -e * (k1 * (c - z / sq * s) - k2 * (wd * s + z * w * c)) \
+        - 1 / (w ** 2 * dt)
+
+    b = np.array([b12,
+                  b11 - a22 * b12 + a12 * b22,
+                  a12 * b21 - a22 * b11])
+    a = np.array([1.0, -(a11 + a22), a11 * a22 - a12 * a21])
+    return b, a
+
+
+class SensorStream:
+    def __init__(self, name: str, time_step: float,
+                 location: Tuple[float, float] = None):
+        """Acceleration record of a sensor received in chunks
+
+        Parameters
+        ----------
+        name : str
+            Sensor name
+        time_step : float
+            Time step of the record [s]
+        location : Tuple[float, float], optional
+            Sensor location in cm, by default None
+        """
+        if time_step <= 0:
+            raise ValueError("Time step must be positive!")
+
+        self.name = name
+        self.time_step = float(time_step)
+        self.location = location
+
+        self.pga = 0.0
+        self._chunks = []
+        self._n_samples = 0
+
+        # (period, damping): filter coefficients, filter state, peak |u|
+        self._oscillators = dict()
+        self._lock = threading.Lock()
+
+    @property
+    def n_samples(self) -> int:
+        return self._n_samples
+
+    @property
+    def periods(self) -> List[Tuple[float, float]]:
+        """Tracked periods and dampings"""
+        return list(self._oscillators)
+
+    def _history(self) -> np.ndarray:
+        if self._chunks is None:
+            raise ValueError(f"History of sensor {self.name} is not loaded")
+        if len(self._chunks) > 1:
+            self._chunks = [np.concatenate(self._chunks)]
+        return self._chunks[0] if self._chunks else np.zeros(0)
+
+    def _track(self, period: float, damping: float) -> None:
+        # Replays the history once, then updated chunk by chunk
+        b, a = get_recursion_filter(period, damping, self.time_step)
+        if self._n_samples == 0:
+            # Oscillator at rest, lfilter returns an uninitialized state
+            # on an empty signal
+            state, peak = np.zeros(2), 0.0
+        else:
+            u, state = lfilter(b, a, self._history(), zi=np.zeros(2))
+            peak = np.max(np.abs(u), initial=0.0)
+
+        self._oscillators[(period, damping)] = [b, a, state, peak]
+
+    def append(self, acc: Union[List[float], np.ndarray]) -> None:
+        """Appends a chunk of the record, updating the tracked oscillators
+
+        Parameters
+        ----------
+        acc : Union[List[float], np.ndarray]
+            Accelerations in [g] following the previous chunk
+        """
+        acc = np.asarray(acc, dtype=float)
+        if len(acc) == 0:
+            return
+
+        with self._lock:
+            if self._chunks is not None:
+                self._chunks.append(acc)
+            self._n_samples += len(acc)
+            self.pga = max(self.pga, float(np.max(np.abs(acc))))
+
+            for oscillator in self._oscillators.values():
+                b, a, state, peak = oscillator
+                u, oscillator[2] = lfilter(b, a, acc, zi=state)
+                oscillator[3] = max(peak, np.max(np.abs(u)))
+
+    def get_sa_spectrum(self, periods: Iterable[float],
+                        damping: Union[float, Iterable[float]] = 0.02
+                        ) -> np.ndarray:
+        """Spectral accelerations of the record received so far, untracked
+        periods are tracked from now on
+
+        Parameters
+        ----------
+        periods : Iterable[float]
+            Periods [s]
+        damping : Union[float, Iterable[float]], optional
+            Damping ratios broadcastable to periods, by default 0.02
+
+        Returns
+        -------
+        np.ndarray
+            Spectral accelerations in g, Sa(T=0) = PGA
+        """
+        periods = np.atleast_1d(np.asarray(periods, dtype=float))
+        periods, damping = np.broadcast_arrays(periods, damping)
+
+        sa = np.zeros(len(periods))
+        with self._lock:
+            for i, key in enumerate(zip(periods.tolist(), damping.tolist())):
+                if key[0] == 0.0:
+                    sa[i] = self.pga
+                    continue
+
+                if key not in self._oscillators:
+                    self._track(*key)
+
+                sa[i] = (2 * np.pi / key[0]) ** 2 * self._oscillators[key][3]
+
+        return sa
+
+    def to_sensor(self) -> dict:
+        """Sensor in the format of Risk, spectra read from the stream"""
+        return {"name": self.name, "location": self.location,
+                "stream": self}
+
+    def to_state(self) -> dict:
+        """Stream state as a Redis hash, without the history"""
+        oscillators = [[*key, *value[2].tolist(), float(value[3])]
+                       for key, value in self._oscillators.items()]
+        return {"time_step": repr(self.time_step),
+                "location": orjson.dumps(self.location),
+                "pga": repr(self.pga),
+                "n_samples": self._n_samples,
+                "oscillators": orjson.dumps(oscillators)}
+
+    @classmethod
+    def from_state(cls, name: str, state: dict,
+                   history: Optional[bytes] = None) -> "SensorStream":
+        """Stream from its Redis hash
+
+        Parameters
+        ----------
+        name : str
+            Sensor name
+        state : dict
+            Redis hash, see to_state
+        history : bytes, optional
+            Accelerations received so far as float64, required to track new
+            periods, by default None
+
+        Returns
+        -------
+        SensorStream
+        """
+        stream = cls(name, float(state[b"time_step"]),
+                     orjson.loads(state[b"location"]))
+        stream.pga = float(state[b"pga"])
+        stream._n_samples = int(state[b"n_samples"])
+        stream._chunks = None if history is None else \
+            [np.frombuffer(history, dtype="<f8")]
+
+        for period, damping, zi0, zi1, peak in orjson.loads(
+                state[b"oscillators"]):
+            b, a = get_recursion_filter(period, damping, stream.time_step)
+            stream._oscillators[(period, damping)] = [
+                b, a, np.array([zi0, zi1]), peak]
+        return stream
+
+
+async def append_chunk(client: redis.asyncio.Redis, name: str,
+                       time_step: float, location: Tuple[float, float],
+                       offset: int, acc: List[float]) -> SensorStream:
+    """Appends a chunk to the stream of a sensor, created on its first chunk
+
+    Parameters
+    ----------
+    client : redis.asyncio.Redis
+        Redis client holding the streams
+    name : str
+        Sensor name
+    time_step : float
+        Time step of the record [s]
+    location : Tuple[float, float]
+        Sensor location in cm
+    offset : int
+        Index of the first sample of the chunk in the record
+    acc : List[float]
+        Accelerations in [g]
+
+    Returns
+    -------
+    SensorStream
+        Stream with the chunk, without the history
+
+    Raises
+    ------
+    StreamConflictError
+        Chunk does not follow the samples received so far, or the time step
+        differs from that of the stream
+    """
+    key = STREAM_KEY.format(name)
+    acc = np.asarray(acc, dtype="<f8")
+
+    for _ in range(STREAM_RETRIES):
+        async with client.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(key)
+                state = await pipe.hgetall(key)
+
+                if state:
+                    stream = SensorStream.from_state(name, state)
+                    if stream.time_step != time_step:
+                        raise StreamConflictError(
+                            f"Time step of sensor {name} changed, reset the "
+                            "streams")
+                    stream.location = location
+                else:
+                    stream = SensorStream(name, time_step, location)
+
+                if offset != stream.n_samples:
+                    raise StreamConflictError(
+                        f"Chunk of sensor {name} starts at sample {offset}, "
+                        f"expected {stream.n_samples}")
+
+                stream.append(acc)
+
+                pipe.multi()
+                pipe.hset(key, mapping=stream.to_state())
+                pipe.append(HISTORY_KEY.format(name), acc.tobytes())
+                pipe.sadd(STREAMS_KEY, name)
+                for k in (key, HISTORY_KEY.format(name), STREAMS_KEY):
+                    pipe.expire(k, STREAM_SECONDS)
+                await pipe.execute()
+                return stream
+
+            except WatchError:
+                continue
+
+    raise StreamConflictError(
+        f"Stream of sensor {name} is updated concurrently, resend the chunk")
+
+
+async def load_streams(client: redis.asyncio.Redis) -> List[SensorStream]:
+    """Streams of all sensors of the ongoing event, with their history"""
+    names = sorted(name.decode() for name in
+                   await client.smembers(STREAMS_KEY))
+
+    pipe = client.pipeline(transaction=True)
+    for name in names:
+        pipe.hgetall(STREAM_KEY.format(name))
+        pipe.get(HISTORY_KEY.format(name))
+    values = await pipe.execute()
+
+    streams = []
+    for name, state, history in zip(names, values[::2], values[1::2]):
+        if state:
+            streams.append(SensorStream.from_state(name, state,
+                                                   history or b""))
+    return streams
+
+
+async def save_oscillators(client: redis.asyncio.Redis,
+                           stream: SensorStream) -> None:
+    """Stores the oscillators tracked since the stream was loaded, unless
+    chunks were appended in the meantime
+    """
+    key = STREAM_KEY.format(stream.name)
+    async with client.pipeline(transaction=True) as pipe:
+        try:
+            await pipe.watch(key)
+            n_samples = await pipe.hget(key, "n_samples")
+            if n_samples is None or int(n_samples) != stream.n_samples:
+                return
+
+            pipe.multi()
+            pipe.hset(key, "oscillators", stream.to_state()["oscillators"])
+            await pipe.execute()
+
+        except WatchError:
+            # Tracked again from the history on the next refresh
+            pass
+
+
+async def clear_streams(client: redis.asyncio.Redis) -> None:
+    """Deletes the streams of all sensors, at the end of the event"""
+    names = [name.decode() for name in await client.smembers(STREAMS_KEY)]
+    keys = [STREAM_KEY.format(name) for name in names]
+    keys += [HISTORY_KEY.format(name) for name in names]
+    await client.delete(STREAMS_KEY, *keys)
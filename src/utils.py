@@ -1,17 +1,20 @@
 from pathlib import Path
+import asyncio
 import json
-import requests
+import httpx
 from typing import Tuple
-from requests.adapters import HTTPAdapter
-from urllib3.util import Retry
+
+from .map_format import has_map_bundle, load_map_bundle
 
 
 def read_map(path: Path, filename: str) -> dict:
-    """Reads map in json format
+    """Reads map, from its binary bundle if converted (see map_format),
+    otherwise in json format
 
     Structure of "cells"
     cells - id: int                 ID of cell, left to right, top to bottom sequence from 0 to cell_qnt - 1
             connections: List[int]  Possible outgoing paths
+    A binary bundle provides "offsets" and "neighbors" arrays instead
 
     Parameters
     ----------
@@ -25,26 +28,44 @@ def read_map(path: Path, filename: str) -> dict:
     dict
     """    
     if filename.endswith("_tested.png"):
-        filename.replace("_tested.png", "")
+        filename = filename.replace("_tested.png", "")
+
+    if has_map_bundle(path, filename):
+        return load_map_bundle(path, filename)
+
     filepath = filename + ".json"
-    return json.load(open(path / filepath))
-
-
-def requests_retry_session(
-    retries: int = 3, 
-    backoff_factor: float = 0.3, 
-    status_forcelist: Tuple[int] = (500, 502, 504), 
-    session: requests.Session = None,
-):
-    session = session or requests.Session()
-    retry = Retry(
-        total=retries,
-        read=retries,
-        connect=retries,
-        backoff_factor=backoff_factor,
-        status_forcelist=status_forcelist,
-    )
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount('http://', adapter)
-    session.mount('https://', adapter)
-    return session
+    with open(path / filepath) as f:
+        return json.load(f)
+
+
+async def async_request_with_retries(
+    client: httpx.AsyncClient,
+    method: str,
+    url: str,
+    retries: int = 3,
+    backoff_factor: float = 0.3,
+    status_forcelist: Tuple[int] = (500, 502, 504),
+    **kwargs,
+) -> httpx.Response:
+    """Sends a request, retried on transport errors and on the statuses of
+    status_forcelist with exponential backoff, sleeping without blocking the
+    event loop
+
+    Raises
+    ------
+    httpx.HTTPError
+        Request failed, or retries on status_forcelist exhausted
+    """
+    for attempt in range(retries + 1):
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.TransportError:
+            if attempt == retries:
+                raise
+        else:
+            if response.status_code not in status_forcelist:
+                return response
+            if attempt == retries:
+                response.raise_for_status()
+
+        await asyncio.sleep(backoff_factor * 2 ** attempt)
@@ -0,0 +1,120 @@
+"""
+Bulk inventory loader against the per-component queries it replaces, on
+a mongomock inventory
+"""
+import mongomock
+import pytest
+from bson import ObjectId
+
+from src.inventory import (FRAGILITY_PROJECTION, LOCATION_PROJECTION,
+                           load_inventory)
+
+
+def load_inventory_per_component(db, scene_name: str) -> dict:
+    """Inventory as loaded before, one query per component and collection,
+    with the locations restricted to the fields used for risk mapping
+    """
+    coordinates = db["realcoordinates"] if scene_name.lower().startswith(
+        "real") else db["coordinates"]
+
+    inventory = dict()
+    for item in db["components"].find({}, {"_id": 1}):
+        locations = list(coordinates.find({"component": item["_id"]},
+                                          LOCATION_PROJECTION))
+        if not locations:
+            continue
+
+        damages = list(db["damages"].find(
+            {"component": item["_id"]}, {"mean": 1, "dispersion": 1})
+            .sort("mean", -1).limit(1))
+        fragility = db["fragilities"].find_one({"component": item["_id"]},
+                                               FRAGILITY_PROJECTION)
+
+        inventory[str(item["_id"])] = {
+            "locations": locations,
+            "damages": damages,
+            "fragilities": fragility,
+        }
+
+    return inventory
+
+
+@pytest.fixture
+def db():
+    db = mongomock.MongoClient()["inventory"]
+    components = [ObjectId() for _ in range(6)]
+    db["components"].insert_many([{"_id": component, "name": f"c{i}"}
+                                  for i, component in enumerate(components)])
+
+    for i, component in enumerate(components):
+        # Last component has no locations
+        if i < 5:
+            for collection in ("coordinates", "realcoordinates"):
+                db[collection].insert_many([{
+                    "component": component,
+                    "topLeft": [100.0 * i + j, 50.0 * j],
+                    "bottomRight": [100.0 * i + j + 80, 50.0 * j + 40],
+                    "influenceRadius": 100.0 * j,
+                    "name": f"{collection}-{i}-{j}",
+                } for j in range(1 + i % 3)])
+
+        # Several damage states, the largest mean is not the first
+        db["damages"].insert_many([
+            {"component": component, "name": "slight", "mean": 0.1 + i,
+             "dispersion": 0.3},
+            {"component": component, "name": "extensive", "mean": 0.8 + i,
+             "dispersion": 0.5},
+            {"component": component, "name": "moderate", "mean": 0.4 + i,
+             "dispersion": 0.4},
+        ][:1 + i % 3])
+
+        # Component 3 has no fragility, the others one or two
+        if i != 3:
+            db["fragilities"].insert_many([
+                {"component": component, "imName": "PGA", "rank": 0},
+                {"component": component, "imName": "SA(1.0s, 5%)",
+                 "rank": 1},
+            ][:1 + i % 2])
+
+    # Locations of a component missing from the components collection
+    db["coordinates"].insert_one({"component": ObjectId(),
+                                  "topLeft": [0, 0], "bottomRight": [1, 1],
+                                  "influenceRadius": 0})
+    return db
+
+
+@pytest.mark.parametrize("scene_name", ["RealMap", "FictitiousMap"])
+def test_load_inventory_matches_per_component_queries(db, scene_name):
+    inventory = load_inventory(db, scene_name)
+
+    assert inventory == load_inventory_per_component(db, scene_name)
+
+
+def test_load_inventory_selects_components(db):
+    inventory = load_inventory(db, "RealMap")
+    components = [item["_id"] for item in db["components"].find()]
+
+    # Components without locations are skipped
+    assert list(inventory) == [str(component)
+                               for component in components[:5]]
+
+    for i, component in enumerate(components[:5]):
+        entry = inventory[str(component)]
+
+        assert len(entry["locations"]) == 1 + i % 3
+        assert all(location["_id"] is not None and "name" not in location
+                   for location in entry["locations"])
+
+        # Critical damage state, largest mean
+        damages = list(db["damages"].find({"component": component}))
+        assert [damage["mean"] for damage in entry["damages"]] == \
+            [max(damage["mean"] for damage in damages)]
+        assert set(entry["damages"][0]) == {"_id", "mean", "dispersion"}
+
+        # First fragility function
+        if i == 3:
+            assert entry["fragilities"] is None
+        else:
+            assert entry["fragilities"]["imName"] == "PGA"
+            assert set(entry["fragilities"]) == {"_id", "component",
+                                                 "imName"}
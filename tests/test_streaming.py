@@ -0,0 +1,82 @@
+"""
+Running spectra of streamed records against get_sat on the full record,
+and streams kept in a fakeredis server
+"""
+import asyncio
+
+import fakeredis.aioredis
+import numpy as np
+import pytest
+
+from src.get_sat import get_sat
+from src.streaming import (SensorStream, StreamConflictError, append_chunk,
+                           load_streams)
+
+PERIODS = [0.0, 0.1, 0.5, 1.0]
+DAMPING = 0.02
+DT = 0.01
+
+
+@pytest.fixture
+def record():
+    # Band-limited record, resolved by both integration schemes
+    rng = np.random.default_rng(0)
+    time = np.arange(3000) * DT
+    freqs = rng.uniform(0.5, 5.0, 20)
+    phases = rng.uniform(0, 2 * np.pi, 20)
+    acc = 0.05 * np.sin(2 * np.pi * np.outer(time, freqs) + phases).sum(1)
+    acc *= np.exp(-((time - 8) / 4) ** 2)
+    return acc, time
+
+
+def expected_sa(acc, time):
+    return np.array([get_sat(acc, time, period, DAMPING)
+                     for period in PERIODS])
+
+
+def test_empty_chunk_then_record(record):
+    acc, time = record
+    stream = SensorStream("s1", DT)
+    stream.append([])
+    stream.get_sa_spectrum(PERIODS, DAMPING)
+    for chunk in np.array_split(acc, 5):
+        stream.append(chunk)
+
+    sa = stream.get_sa_spectrum(PERIODS, DAMPING)
+    np.testing.assert_allclose(sa, expected_sa(acc, time), rtol=1e-2)
+
+
+def test_periods_tracked_mid_stream(record):
+    acc, time = record
+    stream = SensorStream("s1", DT)
+    chunks = np.array_split(acc, 5)
+    stream.append(chunks[0])
+    stream.get_sa_spectrum(PERIODS[:2], DAMPING)
+    for chunk in chunks[1:]:
+        stream.append(chunk)
+
+    sa = stream.get_sa_spectrum(PERIODS, DAMPING)
+    np.testing.assert_allclose(sa, expected_sa(acc, time), rtol=1e-2)
+
+
+def test_streams_in_redis(record):
+    acc, time = record
+
+    async def stream_record():
+        client = fakeredis.aioredis.FakeRedis()
+        offset = 0
+        for chunk in np.array_split(acc, 5):
+            await append_chunk(client, "s1", DT, (1.0, 2.0), offset, chunk)
+            offset += len(chunk)
+
+        with pytest.raises(StreamConflictError):
+            await append_chunk(client, "s1", DT, (1.0, 2.0), offset + 1, [0])
+        with pytest.raises(StreamConflictError):
+            await append_chunk(client, "s1", 2 * DT, (1.0, 2.0), offset, [0])
+        return await load_streams(client)
+
+    streams = asyncio.run(stream_record())
+    assert [stream.n_samples for stream in streams] == [len(acc)]
+
+    sa = streams[0].get_sa_spectrum(PERIODS, DAMPING)
+    np.testing.assert_allclose(sa, expected_sa(acc, time), rtol=1e-2)